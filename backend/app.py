@@ -1,26 +1,144 @@
 import re
+import io
 import os
 import tempfile
-import pytesseract
+import zipfile
 from PIL import Image
-import pdf2image
+from pdf2image.parsers import parse_buffer_to_pgm
 import numpy as np
-import torch
 from fastapi import FastAPI, File, UploadFile, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.background import BackgroundTask
+from starlette.formparsers import MultiPartParser
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Union
 import json
+import hashlib
+import sqlite3
+import subprocess
+import time
 from datetime import datetime
 import logging
-import traceback
+import atexit
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 import asyncio
+import gc
+import threading
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import aiofiles
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+try:
+    import ahocorasick  # optional C implementation of the keyword automaton
+except ImportError:
+    ahocorasick = None
+
+try:
+    import prometheus_client  # optional, enables /metrics
+except ImportError:
+    prometheus_client = None
+
+# Logging: LOG_LEVEL sets the level and LOG_FORMAT is "text" or "json" (one
+# object per line, including any `extra` fields). Handlers run on a background
+# thread fed through a queue, so log I/O never blocks a request. Below 1,
+# LOG_DEBUG_SAMPLE_RATE keeps only that fraction of DEBUG records
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+class JSONLogFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+    
+    RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class DebugSampler(logging.Filter):
+    """Let through only a fraction of DEBUG records; other levels always pass."""
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener's handler."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, since args and exc_info may
+        # not survive the trip to the listener thread, but keep extra fields
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT,
+                      debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE,
+                      queued: bool = True) -> Optional[QueueListener]:
+    """Install the root log handler, behind a queue and listener thread unless queued is False."""
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JSONLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    listener = None
+    root_handler: logging.Handler = handler
+    if queued:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root_handler = _QueueHandler(log_queue)
+        listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    if debug_sample_rate < 1:
+        root_handler.addFilter(DebugSampler(debug_sample_rate))
+    
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(root_handler)
+    root.setLevel(level)
+    
+    if listener is not None:
+        listener.start()
+        atexit.register(listener.stop)
+    return listener
+
+def _init_ocr_worker():
+    """OCR worker process initializer.
+    
+    A forked worker inherits the queue handler but not the listener thread,
+    so it logs straight to its own stream handler instead.
+    """
+    configure_logging(queued=False)
+
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
 
 # FastAPI app setup
@@ -46,6 +164,106 @@ UPLOAD_FOLDER = 'temp_uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max file size
 
+# Upload budgets: request bodies are counted as they arrive and cut off with a
+# 413 once they exceed their endpoint's size limit (plus multipart overhead), or
+# with a 408 if they take longer than UPLOAD_TIME_BUDGET_SECONDS to arrive.
+# Uploads are then read and hashed UPLOAD_CHUNK_SIZE bytes at a time
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_TIME_BUDGET_SECONDS = float(os.getenv("UPLOAD_TIME_BUDGET_SECONDS", 60))
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+# OCR worker pool configuration. OCR_MAX_PENDING caps the OCR slots held: one per
+# admitted request plus one per extra page task running or queued in the pool.
+# While it is reached new /analyze requests get a 503 with Retry-After
+OCR_MAX_WORKERS = max(1, int(os.getenv("OCR_MAX_WORKERS", os.cpu_count() or 1)))
+OCR_MAX_PENDING = max(1, int(os.getenv("OCR_MAX_PENDING", OCR_MAX_WORKERS * 8)))
+OCR_RETRY_AFTER_SECONDS = int(os.getenv("OCR_RETRY_AFTER_SECONDS", 5))
+PDF_DPI = 200
+# "parallel" OCRs pages concurrently across the pool; "streaming" rasterizes a
+# small window of pages at a time in one worker to keep peak memory flat
+PDF_OCR_MODE = os.getenv("PDF_OCR_MODE", "parallel")
+PDF_STREAM_WINDOW = max(1, int(os.getenv("PDF_STREAM_WINDOW", 1)))
+# Pages whose embedded text layer has at least this many non-whitespace
+# characters are read directly instead of being OCR'd, unless the page also
+# carries an image of at least TEXT_LAYER_MAX_IMAGE_AREA square inches: that is
+# a scan with a small text header or footer, and its body is only in the image
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", 20))
+TEXT_LAYER_MAX_IMAGE_AREA = float(os.getenv("TEXT_LAYER_MAX_IMAGE_AREA", 16))
+# Uploads up to this size are decoded and rasterized straight from memory;
+# larger ones are spooled to a temp file once and handed to workers by path.
+# PDFs OCR'd page by page in parallel are always spooled, so the document is
+# not pickled into every page task. Starlette's multipart parser already
+# writes file parts larger than its spool_max_size (1 MB) to an anonymous
+# temp file before the handler runs, so the threshold is capped at that size:
+# above it the upload has been on disk once regardless
+UPLOAD_SPOOL_THRESHOLD = min(
+    int(os.getenv("UPLOAD_SPOOL_THRESHOLD", MultiPartParser.spool_max_size)),
+    MultiPartParser.spool_max_size
+)
+
+# Adaptive OCR: page segmentation modes are tried in order and the remaining
+# ones are skipped once the mean word confidence reaches the threshold
+OCR_PSM_MODES = [int(m) for m in os.getenv("OCR_PSM_MODES", "6,4,3").split(',')]
+PDF_OCR_PSM_MODES = [int(m) for m in os.getenv("PDF_OCR_PSM_MODES", "3").split(',')]
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", 80))
+
+# Image preprocessing before OCR, run in the OCR workers. Stages run in this
+# order and any can be dropped from OCR_PREPROCESS_STAGES: "resize" downscales
+# to OCR_TARGET_DPI (assuming an A4 page when the image carries no DPI),
+# "deskew" straightens pages tilted up to OCR_DESKEW_MAX_ANGLE degrees,
+# "crop" trims blank margins and dark background around the page and
+# "threshold" binarizes against the local mean
+OCR_PREPROCESS_STAGES = [s.strip() for s in os.getenv("OCR_PREPROCESS_STAGES", "resize,deskew,crop,threshold").split(',') if s.strip()]
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", 300))
+OCR_DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", 5))
+OCR_THRESHOLD_BLOCK = 31  # local mean window in pixels (odd)
+OCR_THRESHOLD_OFFSET = 10  # how much darker than the local mean counts as ink
+A4_LONG_SIDE_INCHES = 11.69
+
+# Transformers models are loaded on first use; a positive idle timeout unloads
+# them again after that many seconds without use
+MODEL_IDLE_TIMEOUT_SECONDS = float(os.getenv("MODEL_IDLE_TIMEOUT_SECONDS", 0))
+MODEL_IDLE_CHECK_INTERVAL_SECONDS = 60
+
+# Inference backend for the clinical models: "pytorch" runs transformers eagerly,
+# "onnx" exports each model to ONNX once, applies dynamic int8 quantization and
+# runs it through ONNX Runtime (requires optimum[onnxruntime])
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")  # avx2, avx512, avx512_vnni or arm64
+
+# Biomedical NER stage: reports are split into chunks of at most NER_MAX_TOKENS
+# tokens, and chunks from concurrent requests are coalesced into one pipeline
+# call of up to NER_BATCH_SIZE chunks, waiting at most NER_BATCH_WAIT_MS
+NER_ENABLED = os.getenv("NER_ENABLED", "true").lower() in ("1", "true", "yes")
+NER_MAX_TOKENS = int(os.getenv("NER_MAX_TOKENS", 256))
+NER_BATCH_SIZE = max(1, int(os.getenv("NER_BATCH_SIZE", 16)))
+NER_BATCH_WAIT_MS = float(os.getenv("NER_BATCH_WAIT_MS", 10))
+
+# Responses carry a Server-Timing header with the pipeline stage durations
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Batch analysis limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 500))
+BATCH_MAX_TOTAL_SIZE = int(os.getenv("BATCH_MAX_TOTAL_SIZE", 512 * 1024 * 1024))
+BATCH_MAX_CONCURRENCY = max(1, int(os.getenv("BATCH_MAX_CONCURRENCY", OCR_MAX_WORKERS)))
+
+# Background job queue for long-running analyses
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", 2)))
+JOB_QUEUE_SIZE = max(1, int(os.getenv("JOB_QUEUE_SIZE", 100)))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", 60 * 60))
+JOB_RETRY_AFTER_SECONDS = 30
+
+# Reference range statuses that count as a normal result
+NORMAL_STATUSES = {'normal', 'optimal', 'good', 'normal_female', 'normal_male'}
+
+# Result cache configuration. Bump ANALYZER_VERSION whenever extraction or
+# analysis output changes so stale cached results are not served.
+ANALYZER_VERSION = "1.4.0"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 256))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", 24 * 60 * 60))
+ANALYSIS_CACHE_DB = os.getenv("ANALYSIS_CACHE_DB")  # optional on-disk SQLite tier
+
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -57,12 +275,14 @@ TESSERACT_PATHS = [
     '/opt/homebrew/bin/tesseract'  # macOS with M1 Homebrew
 ]
 
+# Tesseract is run directly with its stdin/stdout interface; falls back to PATH
+tesseract_cmd = 'tesseract'
 tesseract_found = False
 for path in TESSERACT_PATHS:
     if os.path.exists(path):
-        pytesseract.pytesseract.tesseract_cmd = path
+        tesseract_cmd = path
         tesseract_found = True
-        logger.info(f"Tesseract found at: {path}")
+        logger.info("Tesseract found at: %s", path)
         break
 
 if not tesseract_found:
@@ -73,6 +293,20 @@ class LabValue(BaseModel):
     value: float
     status: str
     normal: bool
+    matched_ranges: List[str] = []
+    note: Optional[str] = None
+
+class PageStats(BaseModel):
+    page: int
+    method: str  # 'text_layer' or 'ocr'
+    characters: int
+    duration_ms: float
+    ocr_psm: Optional[int] = None
+    ocr_confidence: Optional[float] = None
+    ocr_passes: Optional[int] = None
+    rasterize_ms: Optional[float] = None
+    preprocess_ms: Dict[str, float] = {}
+    ocr_ms: Optional[float] = None
 
 class AnalysisResult(BaseModel):
     conditions: List[str]
@@ -84,12 +318,16 @@ class AnalysisResult(BaseModel):
     analysis_timestamp: str
     filename: str
     extracted_text_length: int
+    page_stats: List[PageStats] = []
+    cached: bool = False
 
 class HealthResponse(BaseModel):
     status: str
     message: str
     tesseract_available: bool
     analyzer_ready: bool
+    models_loaded: Dict[str, bool] = {}
+    model_backend: str = MODEL_BACKEND
 
 class SupportedFormatsResponse(BaseModel):
     supported_formats: List[str]
@@ -102,51 +340,1239 @@ class APIResponse(BaseModel):
     data: Optional[AnalysisResult] = None
     error: Optional[str] = None
 
+class BatchItemResponse(APIResponse):
+    index: int
+    filename: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # 'queued', 'running', 'completed' or 'failed'
+    filename: str
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    queue_position: Optional[int] = None
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    result: Optional[AnalysisResult] = None
+    error: Optional[str] = None
+
+class OCRStatsResponse(BaseModel):
+    workers: int
+    in_flight: int
+    queue_depth: int
+    reserved: int
+    max_pending: int
+    rejected: int
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    memory_hits: int
+    disk_hits: int
+    hit_ratio: float
+    memory_entries: int
+    max_entries: int
+    ttl_seconds: float
+    disk_enabled: bool
+
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-class MedicalReportAnalyzer:
-    def __init__(self):
-        """Initialize the medical report analyzer with fallback to basic analysis."""
-        logger.info("Initializing Medical Report Analyzer...")
-        
-        # Initialize NLP models with error handling
-        self.clinical_classifier = None
-        self.ner_pipeline = None
+def model_to_dict(model: BaseModel) -> Dict[str, Any]:
+    """Convert a pydantic model to a plain dict (pydantic v1 and v2)."""
+    return model.model_dump() if hasattr(model, 'model_dump') else model.dict()
+
+# Prometheus metrics; gauges reading the executor, cache and job queue are
+# registered next to those instances
+if prometheus_client is not None:
+    STAGE_DURATION = prometheus_client.Histogram(
+        'report_analyzer_stage_duration_seconds', 'Time spent in each analysis pipeline stage',
+        ['stage', 'file_type'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+    DOCUMENT_DURATION = prometheus_client.Histogram(
+        'report_analyzer_document_duration_seconds', 'Extraction and analysis time per uncached document',
+        ['file_type', 'pages'], buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        'report_analyzer_cache_lookups_total', 'Analysis cache lookups', ['result']
+    )
+    REQUESTS_IN_FLIGHT = prometheus_client.Gauge(
+        'report_analyzer_requests_in_flight', 'Analysis requests being handled', ['path']
+    )
+else:
+    STAGE_DURATION = DOCUMENT_DURATION = CACHE_LOOKUPS = REQUESTS_IN_FLIGHT = None
+
+# Stage durations of the request being handled, for its Server-Timing header,
+# and the file type of the document being analyzed, for metric labels
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+current_file_type: ContextVar[str] = ContextVar('current_file_type', default='unknown')
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage duration to the current request's timings and the stage histogram."""
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    if STAGE_DURATION is not None:
+        STAGE_DURATION.labels(stage=stage, file_type=current_file_type.get()).observe(seconds)
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time the enclosed block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def page_count_label(pages: int) -> str:
+    """Bucket a page count so it can be used as a metric label."""
+    if pages <= 1:
+        return "1"
+    if pages <= 5:
+        return "2-5"
+    if pages <= 20:
+        return "6-20"
+    return "21+"
+
+class OCRSlot:
+    """One admitted request's reservation in the OCR backlog.
+    
+    Taken by OCRExecutor.admit() once a request is known to need OCR. Inside
+    `with slot:` the first OCR task of the request runs on this reservation;
+    further concurrent tasks (pages OCR'd in parallel) each take a slot of
+    their own. Leaving the block gives the reservation back.
+    """
+    
+    def __init__(self, executor: 'OCRExecutor'):
+        self._executor = executor
+        self.busy = False
+        self.released = False
+        self._token = None
+    
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._executor._release_slot()
+    
+    def __enter__(self) -> 'OCRSlot':
+        self._token = current_ocr_slot.set(self)
+        return self
+    
+    def __exit__(self, *exc_info):
+        current_ocr_slot.reset(self._token)
+        self.release()
+
+# The OCR slot of the request being handled, if it was admitted
+current_ocr_slot: ContextVar[Optional[OCRSlot]] = ContextVar('current_ocr_slot', default=None)
+
+class OCRExecutor:
+    """Dedicated, bounded process pool for OCR work.
+    
+    Tesseract and rasterization run in OCR_MAX_WORKERS worker processes, apart
+    from the default executor the rest of the app uses. At most max_pending
+    slots are held at once: admit() reserves one for a request up front (or
+    answers 503 if none is free), and every OCR task beyond the one running on
+    its request's reservation waits for a slot of its own, so a burst of
+    requests or a long PDF cannot pile more work onto the pool.
+    """
+    
+    def __init__(self, max_workers: int = OCR_MAX_WORKERS, max_pending: int = OCR_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.reserved = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logger.info("Starting OCR process pool with %s workers", self.max_workers)
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_ocr_worker)
+            return self._pool
+    
+    @property
+    def queue_depth(self) -> int:
+        """OCR tasks waiting for a free worker."""
+        return max(0, self.in_flight - self.max_workers)
+    
+    @property
+    def saturated(self) -> bool:
+        return self.reserved >= self.max_pending
+    
+    def admit(self) -> OCRSlot:
+        """Reserve an OCR slot for a request, or raise a 503 with Retry-After if none is free.
         
-        # Try to load advanced models, but don't fail if they're not available
+        Runs without awaiting, so checking and taking the slot is atomic on the
+        event loop. Use the returned slot as a context manager around the work.
+        """
+        if self.saturated:
+            self.rejected += 1
+            logger.warning("OCR saturated (%s slots held), rejecting request", self.reserved)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="OCR workers are busy. Please retry later.",
+                headers={"Retry-After": str(OCR_RETRY_AFTER_SECONDS)}
+            )
+        self.reserved += 1
+        return OCRSlot(self)
+    
+    async def _acquire_slot(self):
+        if not self.saturated and not self._waiters:
+            self.reserved += 1
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
         try:
-            from transformers import pipeline
-            logger.info("Attempting to load transformers models...")
-            
-            # Try to load clinical BERT
-            try:
-                self.clinical_classifier = pipeline(
-                    "text-classification",
-                    model="emilyalsentzer/Bio_ClinicalBERT",
-                    device=-1  # Force CPU to avoid CUDA issues
-                )
-                logger.info("Clinical BERT loaded successfully")
-            except Exception as e:
-                logger.warning(f"Could not load Clinical BERT: {e}")
-            
-            # Try to load NER model
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+    
+    def _release_slot(self):
+        self.reserved -= 1
+        while self._waiters and not self.saturated:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the longest waiting task
+                self.reserved += 1
+                waiter.set_result(None)
+    
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) in an OCR worker process, holding an OCR slot while it runs."""
+        slot = current_ocr_slot.get()
+        borrowed = slot is not None and not slot.busy and not slot.released
+        if borrowed:
+            slot.busy = True
+        else:
+            await self._acquire_slot()
+        loop = asyncio.get_event_loop()
+        self.in_flight += 1
+        pool_future = self._get_pool().submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(pool_future, loop=loop)
+        except asyncio.CancelledError:
+            # A task already running in a worker cannot be stopped; keep it
+            # counted, and its slot held, until the worker is done with it
+            if not pool_future.cancel():
+                await asyncio.wait([asyncio.wrap_future(pool_future, loop=loop)])
+            raise
+        finally:
+            self.in_flight -= 1
+            if borrowed:
+                slot.busy = False
+            else:
+                self._release_slot()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'workers': self.max_workers,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'reserved': self.reserved,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected
+        }
+    
+    def shutdown(self, wait: bool = False):
+        """Stop the worker processes if they were started."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+ocr_executor = OCRExecutor()
+
+TSV_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text')
+
+def _tesseract_data(image: Image.Image, psm: int) -> Dict[str, List[Any]]:
+    """Run Tesseract on an in-memory image and return its TSV word data by column.
+    
+    The image is piped to tesseract's stdin as PGM and the TSV is read from
+    stdout, so nothing is written to disk (pytesseract saves every image to a
+    temp file first).
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format='PPM')
+    result = subprocess.run(
+        [tesseract_cmd, 'stdin', 'stdout', '--psm', str(psm), 'tsv'],
+        input=buffer.getvalue(), capture_output=True, check=True
+    )
+    data: Dict[str, List[Any]] = {column: [] for column in TSV_COLUMNS}
+    rows = result.stdout.decode('utf-8', errors='replace').splitlines()
+    for row in rows[1:]:
+        fields = row.split('\t', len(TSV_COLUMNS) - 1)
+        if len(fields) < len(TSV_COLUMNS) - 1:
+            continue
+        fields += [''] * (len(TSV_COLUMNS) - len(fields))
+        for column, value in zip(TSV_COLUMNS, fields):
+            data[column].append(value if column in ('conf', 'text') else int(value))
+    return data
+
+def _ocr_data_to_text(data: Dict[str, List[Any]]) -> tuple:
+    """Rebuild text and mean word confidence from Tesseract TSV word data."""
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        if not word or not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+        conf = float(data['conf'][i])
+        if conf >= 0:
+            confidences.append(conf)
+    
+    text_lines = []
+    previous_paragraph = None
+    for (block_num, par_num, _), words in lines.items():
+        if previous_paragraph is not None and (block_num, par_num) != previous_paragraph:
+            text_lines.append("")
+        text_lines.append(" ".join(words))
+        previous_paragraph = (block_num, par_num)
+    
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_lines), confidence
+
+def _resize_to_dpi(image: Image.Image, target_dpi: int = OCR_TARGET_DPI) -> Image.Image:
+    """Downscale an image to target_dpi; never upscales."""
+    dpi = image.info.get('dpi', (0, 0))[0]
+    if dpi and dpi >= 100:
+        scale = target_dpi / float(dpi)
+    else:
+        # Phone photos carry no useful DPI: fit the long side to an A4 page
+        scale = target_dpi * A4_LONG_SIDE_INCHES / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+def _adaptive_threshold(gray: np.ndarray, block: int = OCR_THRESHOLD_BLOCK,
+                        offset: float = OCR_THRESHOLD_OFFSET) -> np.ndarray:
+    """Binarize against the mean of each pixel's block x block neighbourhood."""
+    pad = block // 2
+    padded = np.pad(gray, pad, mode='edge').astype(np.uint32)
+    # Summed-area table; uint32 wraps around on large images but the window
+    # sums taken from it are exact because they fit in 32 bits
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.uint32)
+    np.cumsum(padded, axis=0, out=padded)
+    np.cumsum(padded, axis=1, out=integral[1:, 1:])
+    window_sums = (integral[block:, block:] - integral[:-block, block:]
+                   - integral[block:, :-block] + integral[:-block, :-block])
+    threshold = window_sums.astype(np.float32) / (block * block) - offset
+    return np.where(gray < threshold, 0, 255).astype(np.uint8)
+
+def _estimate_skew(image: Image.Image, max_angle: float = OCR_DESKEW_MAX_ANGLE, step: float = 0.5) -> float:
+    """Angle that makes text lines horizontal, by maximizing the row profile contrast."""
+    small = image.copy()
+    small.thumbnail((1000, 1000))
+    ink = Image.fromarray(255 - _adaptive_threshold(np.asarray(small), 15))
+    
+    def profile_score(angle: float) -> float:
+        rotated = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0), dtype=np.float32)
+        return float(np.square(np.diff(rotated.sum(axis=1))).sum())
+    
+    # Only move off 0 for a strictly better score, so flat profiles (blank
+    # pages, uniform photos) are left alone
+    best_angle, best_score = 0.0, profile_score(0.0)
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        if angle == 0:
+            continue
+        score = profile_score(float(angle))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def _deskew(image: Image.Image, max_angle: float = OCR_DESKEW_MAX_ANGLE) -> Image.Image:
+    angle = _estimate_skew(image, max_angle)
+    if abs(angle) < 0.25:
+        return image
+    # Fill the exposed corners with the border colour so a photo background
+    # stays one band that crop can remove
+    pixels = np.asarray(image)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    return image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=int(np.median(border)))
+
+def _crop_borders(gray: np.ndarray, margin: int = 10) -> np.ndarray:
+    """Trim blank margins and dark background bands around the page content.
+    
+    Rows and columns that are mostly dark are background (a table behind a
+    photographed page), ones without any dark pixels are blank margin.
+    """
+    ink = gray < 128
+    top, bottom, left, right = 0, ink.shape[0], 0, ink.shape[1]
+    # Two passes: background columns can hide blank rows and vice versa
+    for _ in range(2):
+        region = ink[top:bottom, left:right]
+        row_ink = region.mean(axis=1)
+        rows = np.flatnonzero((row_ink > 0.002) & (row_ink < 0.5))
+        col_ink = region.mean(axis=0)
+        cols = np.flatnonzero((col_ink > 0.002) & (col_ink < 0.5))
+        if not rows.size or not cols.size:
+            return gray
+        top, bottom = top + rows[0], top + rows[-1] + 1
+        left, right = left + cols[0], left + cols[-1] + 1
+    # Tesseract reads best with a little white border around the text
+    return np.pad(gray[top:bottom, left:right], margin, mode='constant', constant_values=255)
+
+def _preprocess_page_image(image: Image.Image, stages: List[str] = OCR_PREPROCESS_STAGES) -> tuple:
+    """Run the enabled preprocessing stages on a grayscale image, returning (image, stage timings in ms)."""
+    timings = {}
+    for stage in stages:
+        start = time.perf_counter()
+        if stage == 'resize':
+            image = _resize_to_dpi(image)
+        elif stage == 'deskew':
+            image = _deskew(image)
+        elif stage == 'threshold':
+            image = Image.fromarray(_adaptive_threshold(np.asarray(image)))
+        elif stage == 'crop':
+            image = Image.fromarray(_crop_borders(np.asarray(image)))
+        else:
+            logger.warning("Unknown OCR preprocessing stage: %s", stage)
+            continue
+        timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+    return image, timings
+
+def _ocr_page_image(image: Image.Image, psm_modes: List[int] = OCR_PSM_MODES,
+                    confidence_threshold: float = OCR_CONFIDENCE_THRESHOLD) -> Dict[str, Any]:
+    """OCR an in-memory page image, trying further PSM modes only while confidence is low."""
+    # Page image stays in memory and reaches tesseract through stdin
+    image = image.convert('L')
+    image, preprocess_ms = _preprocess_page_image(image)
+    best = None
+    passes = 0
+    start = time.perf_counter()
+    for psm in psm_modes:
+        try:
+            data = _tesseract_data(image, psm)
+        except Exception as e:
+            logger.debug("OCR config --psm %s failed: %s", psm, e)
+            continue
+        passes += 1
+        text, confidence = _ocr_data_to_text(data)
+        if best is None or (confidence, len(text.strip())) > (best['ocr_confidence'], len(best['text'].strip())):
+            best = {'text': text, 'ocr_psm': psm, 'ocr_confidence': round(confidence, 2)}
+        if text.strip() and confidence >= confidence_threshold:
+            break
+    
+    if best is None:
+        raise Exception("All OCR passes failed")
+    best['ocr_passes'] = passes
+    best['ocr_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    best['preprocess_ms'] = preprocess_ms
+    return best
+
+def _ocr_image_source(source: Union[bytes, str]) -> Dict[str, Any]:
+    """OCR an image given as in-memory bytes or a file path. Runs inside an OCR worker process."""
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        return _ocr_page_image(image, OCR_PSM_MODES)
+
+def _run_poppler(tool: str, options: List[str], source: Union[bytes, str], outputs: List[str] = ()) -> bytes:
+    """Run a poppler command line tool on a PDF and return its stdout.
+    
+    In-memory PDFs are fed through stdin ("-") so no temp file is written;
+    spooled PDFs are passed by path.
+    """
+    in_memory = isinstance(source, bytes)
+    result = subprocess.run(
+        [tool, *options, '-' if in_memory else source, *outputs],
+        input=source if in_memory else None,
+        capture_output=True, check=True
+    )
+    return result.stdout
+
+def _pdf_page_count(source: Union[bytes, str]) -> int:
+    """Number of pages in a PDF, read with poppler's pdfinfo."""
+    info = _run_poppler('pdfinfo', [], source).decode('utf-8', errors='replace')
+    match = re.search(r'^Pages:\s*(\d+)', info, re.MULTILINE)
+    if not match:
+        raise Exception("Could not read PDF page count")
+    return int(match.group(1))
+
+def _rasterize_pdf_pages(source: Union[bytes, str], first_page: int, last_page: int,
+                         dpi: int = PDF_DPI) -> List[Image.Image]:
+    """Rasterize a page range to grayscale images with pdftoppm, reading its PGM output from memory."""
+    output = _run_poppler(
+        'pdftoppm', ['-r', str(dpi), '-f', str(first_page), '-l', str(last_page), '-gray'], source
+    )
+    return parse_buffer_to_pgm(output)
+
+def _extract_pdf_text_layer(source: Union[bytes, str]) -> List[str]:
+    """Read the embedded text layer of every page with poppler's pdftotext.
+    
+    Returns one string per page (empty for image-only pages).
+    """
+    output = _run_poppler('pdftotext', ['-layout', '-enc', 'UTF-8'], source, ['-'])
+    # pdftotext terminates every page with a form feed
+    pages = output.decode('utf-8', errors='replace').split('\f')
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+def _pdf_scanned_pages(source: Union[bytes, str]) -> set:
+    """Pages holding an image of at least TEXT_LAYER_MAX_IMAGE_AREA square inches.
+    
+    Image sizes come from poppler's `pdfimages -list`, as pixels over the
+    resolution the image is drawn at.
+    """
+    output = _run_poppler('pdfimages', ['-list'], source).decode('utf-8', errors='replace')
+    pages = set()
+    # page num type width height color comp bpc enc interp object ID x-ppi y-ppi size ratio
+    for line in output.splitlines()[2:]:
+        fields = line.split()
+        if len(fields) < 14 or not fields[0].isdigit():
+            continue
+        width, height, x_ppi, y_ppi = (float(fields[i]) for i in (3, 4, 12, 13))
+        if x_ppi > 0 and y_ppi > 0 and (width / x_ppi) * (height / y_ppi) >= TEXT_LAYER_MAX_IMAGE_AREA:
+            pages.add(int(fields[0]))
+    return pages
+
+def _describe_source(source: Union[bytes, str]) -> str:
+    """Short log description of an in-memory or spooled document."""
+    return f"{len(source)} bytes in memory" if isinstance(source, bytes) else f"spooled to {source}"
+
+async def spool_to_disk(content: bytes, suffix: str = '') -> str:
+    """Write an upload to a temp file and return its path; the caller removes it."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_path = temp_file.name
+    async with aiofiles.open(temp_path, 'wb') as f:
+        await f.write(content)
+    logger.debug("Spooled %s byte upload to %s", len(content), temp_path)
+    return temp_path
+
+def _has_text_layer(page_text: str) -> bool:
+    """Check whether a page's text layer holds enough text to skip OCR."""
+    return len(''.join(page_text.split())) >= TEXT_LAYER_MIN_CHARS
+
+def _ocr_pdf_page(source: Union[bytes, str], page_number: int, dpi: int = PDF_DPI) -> Dict[str, Any]:
+    """Rasterize and OCR a single PDF page. Runs inside an OCR worker process."""
+    start = time.perf_counter()
+    images = _rasterize_pdf_pages(source, page_number, page_number, dpi)
+    rasterize_ms = (time.perf_counter() - start) * 1000
+    try:
+        result = _ocr_page_image(images[0], PDF_OCR_PSM_MODES) if images else {'text': ""}
+    finally:
+        for img in images:
+            img.close()
+    result.update(page=page_number, duration_ms=(time.perf_counter() - start) * 1000,
+                  rasterize_ms=round(rasterize_ms, 2))
+    return result
+
+def _page_windows(page_numbers: List[int], window: int) -> List[tuple]:
+    """Split page numbers into (first, last) runs of at most `window` consecutive pages."""
+    windows = []
+    for page_number in page_numbers:
+        if windows:
+            first, last = windows[-1]
+            if page_number == last + 1 and last - first + 1 < window:
+                windows[-1] = (first, page_number)
+                continue
+        windows.append((page_number, page_number))
+    return windows
+
+def _iter_pdf_pages(source: Union[bytes, str], page_numbers: List[int], dpi: int = PDF_DPI,
+                    window: int = PDF_STREAM_WINDOW):
+    """Yield (page_number, image, rasterize_ms) triples, rasterizing at most `window` pages at a time.
+    
+    rasterize_ms is the window's rasterization time split evenly across its pages.
+    """
+    for first_page, last_page in _page_windows(page_numbers, window):
+        start = time.perf_counter()
+        images = _rasterize_pdf_pages(source, first_page, last_page, dpi)
+        rasterize_ms = (time.perf_counter() - start) * 1000 / max(len(images), 1)
+        try:
+            for offset, image in enumerate(images):
+                yield first_page + offset, image, rasterize_ms
+        finally:
+            for img in images:
+                img.close()
+            del images
+
+def _ocr_pdf_streaming(source: Union[bytes, str], page_numbers: List[int], dpi: int = PDF_DPI,
+                       window: int = PDF_STREAM_WINDOW) -> List[Dict[str, Any]]:
+    """OCR a PDF page window by page window. Runs inside an OCR worker process."""
+    page_results = []
+    start = time.perf_counter()
+    for page_number, image, rasterize_ms in _iter_pdf_pages(source, page_numbers, dpi, window):
+        result = _ocr_page_image(image, PDF_OCR_PSM_MODES)
+        # Free the page as soon as it has been OCR'd
+        image.close()
+        now = time.perf_counter()
+        result.update(page=page_number, duration_ms=(now - start) * 1000, rasterize_ms=round(rasterize_ms, 2))
+        page_results.append(result)
+        start = now
+    return page_results
+
+class AnalysisCache:
+    """Content-addressed cache of extracted text and analysis results.
+    
+    Entries are keyed by a SHA-256 of the uploaded bytes plus ANALYZER_VERSION and
+    live in a bounded in-memory LRU. When db_path is set, entries are also written
+    to a SQLite table so they survive restarts and are shared between workers.
+    Both tiers expire entries after ttl_seconds. SQLite is only touched from a
+    dedicated thread, off the event loop.
+    """
+    
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANALYSIS_CACHE_TTL_SECONDS, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # Every SQLite call runs on this one thread, in submission order, so
+        # disk I/O never blocks the event loop and reads see earlier writes
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis-cache")
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        
+        if db_path:
             try:
-                self.ner_pipeline = pipeline(
-                    "ner",
-                    model="d4data/biomedical-ner-all",
-                    aggregation_strategy="simple",
-                    device=-1  # Force CPU
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, result TEXT NOT NULL, expires_at REAL NOT NULL)"
                 )
-                logger.info("NER pipeline loaded successfully")
+                self._db.commit()
+                logger.info("Analysis cache disk tier at: %s", db_path)
             except Exception as e:
-                logger.warning(f"Could not load NER pipeline: {e}")
-                
+                logger.warning("Could not open analysis cache database, using memory only: %s", e)
+                self._db = None
+    
+    @staticmethod
+    def make_key(digest: str) -> str:
+        """Build the cache key for an uploaded document from its SHA-256 hex digest."""
+        return f"{ANALYZER_VERSION}:{digest}"
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {'text', 'result'} for a cached document, or None.
+        
+        The memory tier is checked on the event loop; the SQLite lookup runs on
+        the cache's database thread.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+        
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            row = await loop.run_in_executor(self._db_executor, self._read_disk, key, now)
+            if row is not None:
+                value, expires_at = row
+                with self._lock:
+                    self._store_memory(key, value, expires_at)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key: str, text: str, result: Dict[str, Any]):
+        """Store extracted text and the serialized AnalysisResult for a document.
+        
+        The memory tier is updated right away; the SQLite write is queued on the
+        cache's database thread and not waited for.
+        """
+        expires_at = time.time() + self.ttl_seconds
+        value = {'text': text, 'result': result}
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+        if self._db is not None:
+            self._db_executor.submit(self._write_disk, key, text, json.dumps(result), expires_at)
+    
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        try:
+            row = self._db.execute(
+                "SELECT text, result, expires_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                text, result, expires_at = row
+                if expires_at > now:
+                    return {'text': text, 'result': json.loads(result)}, expires_at
+                self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                self._db.commit()
+        except Exception as e:
+            logger.warning("Analysis cache read failed: %s", e)
+        return None
+    
+    def _write_disk(self, key: str, text: str, result: str, expires_at: float):
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, text, result, expires_at) VALUES (?, ?, ?, ?)",
+                (key, text, result, expires_at)
+            )
+            self._db.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+        except Exception as e:
+            logger.warning("Analysis cache write failed: %s", e)
+    
+    def _store_memory(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def clear(self):
+        """Drop every cached entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._db_executor, self._clear_disk)
+    
+    def _clear_disk(self):
+        self._db.execute("DELETE FROM analysis_cache")
+        self._db.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_enabled': self._db is not None
+            }
+
+class LabValueExtractor:
+    """Precompiled lab value extraction with a literal-anchor prefilter.
+    
+    Every pattern is compiled once and paired with its leading literal word
+    (e.g. 'glucose', 'hdl'). The report is lowercased once and candidate
+    positions are found with str.find on that anchor, so the regex engine only
+    runs where a pattern can actually start instead of scanning the whole text
+    per pattern. Results match the original first-match-wins loop: labs and
+    patterns are tried in table order and the first parseable match wins.
+    """
+    
+    _ANCHOR_RE = re.compile(r'[A-Za-z0-9]+')
+    
+    def __init__(self, lab_ranges: Dict[str, Dict[str, Any]]):
+        # [(lab_name, [(compiled, anchor)], [(unit, conversion_factor)])]
+        self._labs: List[tuple] = []
+        for lab_name, lab_info in lab_ranges.items():
+            patterns = [
+                (re.compile(pattern, re.IGNORECASE), self._literal_anchor(pattern))
+                for pattern in lab_info['patterns']
+            ]
+            unit_conversions = [
+                (unit.lower(), factor) for unit, factor in lab_info.get('unit_conversions', {}).items()
+            ]
+            self._labs.append((lab_name, patterns, unit_conversions))
+    
+    @classmethod
+    def _literal_anchor(cls, pattern: str) -> Optional[str]:
+        """Return the lowercase literal word every match of pattern starts with, if any."""
+        match = cls._ANCHOR_RE.match(pattern)
+        if not match:
+            return None
+        anchor = match.group(0)
+        # A quantifier would make the last anchor character optional
+        if pattern[match.end():match.end() + 1] in ('?', '*', '+', '{'):
+            anchor = anchor[:-1]
+        return anchor.lower() or None
+    
+    @staticmethod
+    def _iter_matches(compiled, anchor: Optional[str], text: str, text_lower: Optional[str]):
+        """Yield non-overlapping matches of compiled in order, like finditer."""
+        if anchor is None or text_lower is None:
+            yield from compiled.finditer(text)
+            return
+        pos = text_lower.find(anchor)
+        while pos != -1:
+            match = compiled.match(text, pos)
+            if match:
+                yield match
+                pos = text_lower.find(anchor, max(match.end(), pos + 1))
+            else:
+                pos = text_lower.find(anchor, pos + 1)
+    
+    def extract(self, text: str) -> Dict[str, float]:
+        """Extract lab values from text."""
+        extracted_values = {}
+        text_lower = text.lower()
+        # Anchor positions are only valid if lowercasing kept every offset
+        anchored_text = text_lower if len(text_lower) == len(text) else None
+        
+        for lab_name, patterns, unit_conversions in self._labs:
+            for compiled, anchor in patterns:
+                for match in self._iter_matches(compiled, anchor, text, anchored_text):
+                    try:
+                        value = float(match.group(1))
+                    except (ValueError, IndexError) as e:
+                        logger.debug("Error parsing value for %s: %s", lab_name, e)
+                        continue
+                    
+                    # Handle unit conversions
+                    if unit_conversions:
+                        context = text[max(0, match.start() - 50):match.end() + 50].lower()
+                        for unit, conversion_factor in unit_conversions:
+                            if unit in context:
+                                value *= conversion_factor
+                                break
+                    
+                    extracted_values[lab_name] = value
+                    logger.debug("Found %s: %s", lab_name, value)
+                    break
+                if lab_name in extracted_values:
+                    break
+        
+        return extracted_values
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass.
+    
+    Built once from a {keyword: payload} mapping. Uses pyahocorasick when it is
+    installed and a pure-Python automaton otherwise, so lookup cost depends on the
+    text length rather than on the number of keywords.
+    """
+    
+    def __init__(self, keywords: Dict[str, Any]):
+        self.keywords = dict(keywords)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, payload in self.keywords.items():
+                self._automaton.add_word(keyword, (keyword, payload))
+            self._automaton.make_automaton()
+            return
+        
+        self._automaton = None
+        # State 0 is the root; each state has goto edges, a fail link and the
+        # keywords that end there (including those reached through fail links)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(keyword)
+        
+        # Breadth-first pass to link each state to its longest proper suffix state
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def find(self, text: str) -> Dict[str, Any]:
+        """Return {keyword: payload} for every keyword occurring in text."""
+        if not text or not self.keywords:
+            return {}
+        if self._automaton is not None:
+            return {keyword: payload for _, (keyword, payload) in self._automaton.iter(text)}
+        
+        found = {}
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword in output[state]:
+                    found[keyword] = self.keywords[keyword]
+        return found
+
+class ReferenceRangeIndex:
+    """Interval index over one lab's reference ranges.
+    
+    The range boundaries are sorted once. Each boundary point and each open
+    segment between neighbouring boundaries stores the statuses covering it in
+    table order. A value is classified with one bisect (or np.searchsorted for a
+    whole column). Values covered by several ranges keep the first status and
+    report the others. Values covered by none report the neighbouring ranges.
+    """
+    
+    def __init__(self, lab_name: str, ranges: List[tuple]):
+        self.lab_name = lab_name
+        self.ranges = list(ranges)
+        self.boundaries = sorted({bound for min_val, max_val, _ in self.ranges for bound in (min_val, max_val)})
+        
+        # Statuses containing each boundary point
+        self._point_matches = [
+            tuple(range_status for min_val, max_val, range_status in self.ranges if min_val <= bound <= max_val)
+            for bound in self.boundaries
+        ]
+        # Statuses covering the open segment below boundaries[i] (and above boundaries[i - 1])
+        self._open_matches = []
+        self._open_gaps = []
+        for i in range(len(self.boundaries) + 1):
+            lower = self.boundaries[i - 1] if i > 0 else float('-inf')
+            upper = self.boundaries[i] if i < len(self.boundaries) else float('inf')
+            self._open_matches.append(tuple(
+                range_status for min_val, max_val, range_status in self.ranges
+                if min_val <= lower and upper <= max_val
+            ))
+            self._open_gaps.append(self._describe_gap(lower, upper) if not self._open_matches[-1] else None)
+        
+        # Object arrays of the first matching status, for batch classification
+        self._point_status = np.array([m[0] if m else 'unknown' for m in self._point_matches], dtype=object)
+        self._open_status = np.array([m[0] if m else 'unknown' for m in self._open_matches], dtype=object)
+        self._boundary_array = np.array(self.boundaries, dtype=float)
+    
+    def _describe_gap(self, lower: float, upper: float) -> str:
+        """Describe which reference ranges border an uncovered segment."""
+        below = [(max_val, range_status) for _, max_val, range_status in self.ranges if max_val <= lower]
+        above = [(min_val, range_status) for min_val, _, range_status in self.ranges if min_val >= upper]
+        if below and above:
+            max_val, below_status = max(below, key=lambda r: r[0])
+            min_val, above_status = min(above, key=lambda r: r[0])
+            return (f"falls in a gap between '{below_status}' (up to {max_val:g}) "
+                    f"and '{above_status}' (from {min_val:g})")
+        if above:
+            min_val, above_status = min(above, key=lambda r: r[0])
+            return f"is below the lowest reference range '{above_status}' (from {min_val:g})"
+        if below:
+            max_val, below_status = max(below, key=lambda r: r[0])
+            return f"is above the highest reference range '{below_status}' (up to {max_val:g})"
+        return "has no reference ranges"
+    
+    def table_issues(self) -> List[str]:
+        """List gaps and overlaps in the reference table itself."""
+        issues = []
+        for i, (matches, gap) in enumerate(zip(self._open_matches, self._open_gaps)):
+            lower = self.boundaries[i - 1] if i > 0 else None
+            upper = self.boundaries[i] if i < len(self.boundaries) else None
+            # Leading/trailing segments are open-ended by design
+            if gap and lower is not None and upper is not None:
+                issues.append(f"gap between {lower:g} and {upper:g}")
+            if len(matches) > 1:
+                issues.append(f"overlap of {', '.join(matches)} between {lower:g} and {upper:g}")
+        return issues
+    
+    def classify(self, value: float) -> tuple:
+        """Return (status, matched_statuses, note) for a single value."""
+        if value != value:
+            return 'unknown', (), "value is not a number"
+        i = bisect_left(self.boundaries, value)
+        if i < len(self.boundaries) and self.boundaries[i] == value:
+            matches, gap = self._point_matches[i], None
+        else:
+            matches, gap = self._open_matches[i], self._open_gaps[i]
+        
+        if not matches:
+            return 'unknown', matches, f"{value:g} {gap}" if gap else None
+        note = None
+        if len(matches) > 1:
+            note = f"{value:g} matches overlapping ranges {', '.join(matches)}; reporting '{matches[0]}'"
+        return matches[0], matches, note
+    
+    def classify_many(self, values) -> Dict[str, np.ndarray]:
+        """Classify a column of values at once with np.searchsorted.
+        
+        Returns arrays of 'status', 'normal', 'gap' (no range matched) and
+        'overlap' (more than one range matched), aligned with values.
+        """
+        values = np.asarray(values, dtype=float)
+        idx = np.searchsorted(self._boundary_array, values, side='left')
+        clipped = np.minimum(idx, len(self._boundary_array) - 1)
+        on_boundary = (idx < len(self._boundary_array)) & (self._boundary_array[clipped] == values)
+        
+        status = np.where(on_boundary, self._point_status[clipped], self._open_status[idx])
+        match_counts = np.where(
+            on_boundary,
+            np.array([len(m) for m in self._point_matches])[clipped],
+            np.array([len(m) for m in self._open_matches])[idx]
+        )
+        nan = np.isnan(values)
+        status[nan] = 'unknown'
+        match_counts[nan] = 0
+        return {
+            'status': status,
+            'normal': np.isin(status, list(NORMAL_STATUSES)),
+            'gap': match_counts == 0,
+            'overlap': match_counts > 1
+        }
+
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+
+def _ort_model_class(task: str):
+    """ONNX Runtime model class for a transformers pipeline task."""
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForTokenClassification
+    classes = {
+        'text-classification': ORTModelForSequenceClassification,
+        'ner': ORTModelForTokenClassification,
+        'token-classification': ORTModelForTokenClassification,
+    }
+    if task not in classes:
+        raise ValueError(f"No ONNX Runtime model class for task: {task}")
+    return classes[task]
+
+def export_quantized_onnx(model_name: str, task: str, output_dir: str = ONNX_MODEL_DIR,
+                          quantization: str = ONNX_QUANTIZATION) -> Path:
+    """Export a Hugging Face model to ONNX with dynamic int8 quantization.
+    
+    The quantized graph and tokenizer are written to output_dir/<model name> and
+    reused on later calls. Returns that directory.
+    """
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    
+    target = Path(output_dir) / model_name.replace('/', '__')
+    if (target / ONNX_QUANTIZED_FILE).exists():
+        return target
+    
+    logger.info("Exporting %s to ONNX with %s int8 quantization", model_name, quantization)
+    model_class = _ort_model_class(task)
+    with tempfile.TemporaryDirectory() as export_dir:
+        model_class.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        quantization_config = getattr(AutoQuantizationConfig, quantization)(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=target, quantization_config=quantization_config)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(target)
+    return target
+
+def load_onnx_pipeline(task: str, model_name: str, **kwargs):
+    """Build a transformers pipeline backed by a quantized ONNX Runtime model."""
+    from transformers import AutoTokenizer, pipeline
+    
+    model_dir = export_quantized_onnx(model_name, task)
+    model = _ort_model_class(task).from_pretrained(model_dir, file_name=ONNX_QUANTIZED_FILE)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return pipeline(task, model=model, tokenizer=tokenizer, **kwargs)
+
+class LazyPipeline:
+    """A transformers pipeline that is loaded on first use and shared by all callers.
+    
+    Loading happens once behind a lock. A failed load is remembered so requests
+    do not retry it, until warm_up() is called explicitly. unload_if_idle() drops
+    the pipeline after a period without use to give the memory back.
+    """
+    
+    def __init__(self, name: str, task: str, model: str, backend: str = MODEL_BACKEND, **kwargs):
+        self.name = name
+        self.task = task
+        self.model = model
+        self.backend = backend
+        self.kwargs = kwargs
+        self._pipeline = None
+        self._failed = False
+        self._lock = threading.Lock()
+        self.last_used: Optional[float] = None
+    
+    @property
+    def loaded(self) -> bool:
+        return self._pipeline is not None
+    
+    def get(self):
+        """Return the pipeline, loading it if needed, or None if it is unavailable."""
+        with self._lock:
+            if self._pipeline is None and not self._failed:
+                self._pipeline = self._load()
+                self._failed = self._pipeline is None
+            self.last_used = time.monotonic()
+            return self._pipeline
+    
+    def warm_up(self) -> bool:
+        """Load the pipeline now, retrying a previous failure."""
+        with self._lock:
+            self._failed = False
+        return self.get() is not None
+    
+    def _load(self):
+        try:
+            from transformers import pipeline
         except ImportError:
-            logger.warning("Transformers library not available. Using basic analysis only.")
+            logger.warning("Transformers library not available, %s disabled.", self.name)
+            return None
+        try:
+            start = time.perf_counter()
+            if self.backend == "onnx":
+                loaded = load_onnx_pipeline(self.task, self.model, **self.kwargs)
+            else:
+                loaded = pipeline(self.task, model=self.model, device=-1, **self.kwargs)  # Force CPU
+            logger.info("%s loaded (%s) in %.1fs", self.name, self.backend, time.perf_counter() - start)
+            return loaded
         except Exception as e:
-            logger.warning(f"Error initializing advanced models: {e}")
+            logger.warning("Could not load %s: %s", self.name, e)
+            return None
+    
+    def unload_if_idle(self, idle_timeout: float) -> bool:
+        """Drop the pipeline if it has not been used for idle_timeout seconds."""
+        with self._lock:
+            if self._pipeline is None or self.last_used is None:
+                return False
+            if time.monotonic() - self.last_used < idle_timeout:
+                return False
+            self._pipeline = None
+        gc.collect()
+        logger.info("%s unloaded after %.0fs idle", self.name, idle_timeout)
+        return True
+
+def chunk_text_by_tokens(text: str, tokenizer, max_tokens: int = NER_MAX_TOKENS) -> List[tuple]:
+    """Split text into (char_offset, chunk) pieces of at most max_tokens tokens.
+    
+    Uses the fast tokenizer's offset mapping so chunk boundaries fall between
+    tokens, leaving room for the special tokens the model adds.
+    """
+    if not text.strip():
+        return []
+    window = max(1, max_tokens - 2)
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=False)
+    offsets = [offset for offset in encoding['offset_mapping'] if offset[1] > offset[0]]
+    chunks = []
+    for i in range(0, len(offsets), window):
+        start = offsets[i][0]
+        end = offsets[min(i + window, len(offsets)) - 1][1]
+        chunks.append((start, text[start:end]))
+    return chunks
+
+def sub_with_offsets(pattern: re.Pattern, replacement: str, text: str, offsets: List[int]) -> tuple:
+    """pattern.sub(replacement, text) that also carries a per-character offset map along.
+    
+    offsets[i] is the position of text[i] in some original document; the
+    returned map does the same for the substituted text. Replacement
+    characters map into the span of the match they replaced.
+    """
+    parts, new_offsets = [], []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(text[last:match.start()])
+        new_offsets.extend(offsets[last:match.start()])
+        parts.append(replacement)
+        match_length = match.end() - match.start()
+        new_offsets.extend(offsets[match.start() + min(k, match_length - 1)] for k in range(len(replacement)))
+        last = match.end()
+    parts.append(text[last:])
+    new_offsets.extend(offsets[last:])
+    return "".join(parts), new_offsets
+
+class NERBatcher:
+    """Dynamic micro-batcher for the NER pipeline.
+    
+    Chunks submitted by concurrent requests are queued and flushed together as
+    one pipeline call once batch_size chunks are waiting or max_wait_ms has
+    passed, so the model runs a few large forward passes instead of many small
+    ones. Inference runs on a single dedicated thread.
+    """
+    
+    def __init__(self, get_pipeline: Callable[[], Any], batch_size: int = NER_BATCH_SIZE,
+                 max_wait_ms: float = NER_BATCH_WAIT_MS):
+        self._get_pipeline = get_pipeline
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner")
+    
+    async def run(self, chunks: List[str]) -> List[List[Dict[str, Any]]]:
+        """Run NER over chunks, returning one entity list per chunk."""
+        if not chunks:
+            return []
+        loop = asyncio.get_event_loop()
+        futures = []
+        for chunk in chunks:
+            future = loop.create_future()
+            self._pending.append((chunk, future))
+            futures.append(future)
+        
+        if len(self._pending) >= self.batch_size:
+            self._flush(full_only=True)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await asyncio.gather(*futures)
+    
+    def _flush(self, full_only: bool = False):
+        """Start a pipeline call per batch_size chunks waiting.
+        
+        With full_only, a partial batch left over stays queued for chunks from
+        other requests until the timer fires.
+        """
+        while len(self._pending) >= self.batch_size or (self._pending and not full_only):
+            batch = self._pending[:self.batch_size]
+            self._pending = self._pending[self.batch_size:]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            # Keep a reference so the task is not garbage collected mid-run
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.max_wait, self._flush)
+    
+    async def _run_batch(self, batch: List[tuple]):
+        loop = asyncio.get_event_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._infer, [chunk for chunk, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"NER returned {len(results)} results for {len(batch)} chunks")
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+    
+    def _infer(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        ner = self._get_pipeline()
+        if ner is None:
+            return [[] for _ in texts]
+        logger.debug("Running NER on a batch of %s chunks", len(texts))
+        results = ner(texts, batch_size=self.batch_size)
+        # A single input may come back as a flat (possibly empty) list of entities
+        if len(texts) == 1 and (not results or isinstance(results[0], dict)):
+            results = [results]
+        return results
+
+class MedicalReportAnalyzer:
+    def __init__(self):
+        """Initialize the medical report analyzer with fallback to basic analysis."""
+        logger.info("Initializing Medical Report Analyzer...")
+        
+        # NLP models are loaded lazily on first use (or via warm_up_models)
+        self.models = {
+            'clinical_classifier': LazyPipeline(
+                "Clinical BERT", "text-classification", "emilyalsentzer/Bio_ClinicalBERT"
+            ),
+            'ner_pipeline': LazyPipeline(
+                "NER pipeline", "ner", "d4data/biomedical-ner-all", aggregation_strategy="simple"
+            )
+        }
+        
+        # Coalesces NER chunks from concurrent requests into shared forward passes
+        self.ner_batcher = NERBatcher(lambda: self.ner_pipeline)
         
         # Lab value ranges (this will always work)
         self.lab_ranges = {
@@ -216,150 +1642,254 @@ class MedicalReportAnalyzer:
             }
         }
         
+        # Precompiled single-pass lab value extractor
+        self.lab_extractor = LabValueExtractor(self.lab_ranges)
+        
+        # Interval index per lab for reference range lookups
+        self.range_index = {
+            lab_name: ReferenceRangeIndex(lab_name, lab_info['ranges'])
+            for lab_name, lab_info in self.lab_ranges.items()
+        }
+        for lab_name, index in self.range_index.items():
+            for issue in index.table_issues():
+                logger.debug("Reference ranges for %s: %s", lab_name, issue)
+        
+        # Keyword automaton (keyword -> diseases listing it) and compiled disease patterns
+        disease_keywords: Dict[str, List[str]] = {}
+        for disease, disease_info in self.disease_patterns.items():
+            for keyword in disease_info['keywords']:
+                disease_keywords.setdefault(keyword.lower(), []).append(disease)
+        self.keyword_automaton = KeywordAutomaton(disease_keywords)
+        self.compiled_disease_patterns = {
+            disease: [re.compile(pattern, re.IGNORECASE) for pattern in disease_info['patterns']]
+            for disease, disease_info in self.disease_patterns.items()
+        }
+        
         logger.info("Medical Report Analyzer initialized successfully")
 
-    async def extract_text_from_image(self, image_path: str) -> str:
-        """Extract text from an image file with enhanced preprocessing."""
+    @property
+    def clinical_classifier(self):
+        return self.models['clinical_classifier'].get()
+
+    @property
+    def ner_pipeline(self):
+        return self.models['ner_pipeline'].get()
+
+    def warm_up_models(self) -> Dict[str, bool]:
+        """Load every model now instead of on first use."""
+        return {name: model.warm_up() for name, model in self.models.items()}
+
+    def unload_idle_models(self, idle_timeout: float = MODEL_IDLE_TIMEOUT_SECONDS):
+        """Unload models that have been idle for longer than idle_timeout."""
+        for model in self.models.values():
+            model.unload_if_idle(idle_timeout)
+
+    def models_loaded(self) -> Dict[str, bool]:
+        return {name: model.loaded for name, model in self.models.items()}
+
+    async def extract_text_from_image(self, source: Union[bytes, str],
+                                      progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> tuple:
+        """Extract text from an image, returning (text, page_stats).
+        
+        source is either the uploaded bytes or the path of a spooled upload.
+        """
         try:
-            logger.debug(f"Extracting text from image: {image_path}")
+            logger.debug("Extracting text from image (%s)", _describe_source(source))
             
             # Check if tesseract is available
             if not tesseract_found:
                 raise Exception("Tesseract OCR not found. Please install Tesseract OCR.")
             
-            # Run OCR in thread pool to avoid blocking
-            def _extract_text():
-                image = Image.open(image_path)
-                # Convert to grayscale for better OCR
-                image = image.convert('L')
-                
-                # Try different OCR configurations
-                configs = [
-                    '--psm 6',  # Uniform block of text
-                    '--psm 4',  # Single column of text
-                    '--psm 3'   # Fully automatic page segmentation
-                ]
-                
-                best_text = ""
-                for config in configs:
-                    try:
-                        text = pytesseract.image_to_string(image, config=config)
-                        if len(text.strip()) > len(best_text.strip()):
-                            best_text = text
-                    except Exception as e:
-                        logger.debug(f"OCR config {config} failed: {e}")
-                        continue
-                
-                if not best_text.strip():
-                    # Fallback to basic OCR
-                    best_text = pytesseract.image_to_string(image)
-                
-                return best_text
-            
-            # Run in thread pool
-            loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(None, _extract_text)
+            # Run OCR in the dedicated OCR worker pool
+            start = time.perf_counter()
+            ocr_result = await ocr_executor.run(_ocr_image_source, source)
+            text = ocr_result.pop('text')
+            page_stats = [PageStats(
+                page=1,
+                method='ocr',
+                characters=len(text),
+                duration_ms=(time.perf_counter() - start) * 1000,
+                **ocr_result
+            )]
+            logger.debug(
+                "OCR picked --psm %s at confidence %s after %s passes",
+                ocr_result['ocr_psm'], ocr_result['ocr_confidence'], ocr_result['ocr_passes']
+            )
+            if progress:
+                progress({'event': 'pages', 'total': 1})
+                progress(dict(model_to_dict(page_stats[0]), event='page'))
             
-            logger.debug(f"Extracted {len(text)} characters from image")
-            return text
+            logger.debug("Extracted %s characters from image", len(text))
+            return text, page_stats
             
         except Exception as e:
-            logger.error(f"Error extracting text from image: {e}")
+            logger.error("Error extracting text from image: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=f"Error extracting text from image: {str(e)}"
             )
 
-    async def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from a PDF file."""
+    async def extract_text_from_pdf(self, source: Union[bytes, str], mode: Optional[str] = None,
+                                    progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> tuple:
+        """Extract text from a PDF file, returning (text, page_stats).
+        
+        source is either the uploaded bytes, which poppler reads from stdin, or
+        the path of a spooled upload. Pages with an embedded text layer are read directly; only image-only pages
+        are OCR'd. mode "parallel" OCRs those pages concurrently in the OCR process
+        pool, "streaming" rasterizes them one window at a time so memory stays flat
+        for long PDFs. Defaults to PDF_OCR_MODE.
+        
+        progress, if given, is called with a 'pages' event once the page count is
+        known and a 'page' event as each page finishes.
+        """
         try:
-            logger.debug(f"Extracting text from PDF: {pdf_path}")
-            
-            def _extract_from_pdf():
-                # Convert PDF to images
-                images = pdf2image.convert_from_path(pdf_path, dpi=200)
-                text = ""
-                
-                for i, img in enumerate(images):
-                    logger.debug(f"Processing page {i+1}")
-                    # Save image temporarily
-                    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_img:
-                        img.save(temp_img.name, 'PNG')
-                        # Extract text synchronously within the thread
-                        image = Image.open(temp_img.name)
-                        image = image.convert('L')
-                        page_text = pytesseract.image_to_string(image)
-                        text += f"\n--- Page {i+1} ---\n{page_text}\n"
-                        # Clean up temp file
-                        try:
-                            os.unlink(temp_img.name)
-                        except:
-                            pass
-                
-                return text
+            mode = mode or PDF_OCR_MODE
+            if mode not in ("parallel", "streaming"):
+                raise ValueError(f"Unknown PDF OCR mode: {mode}")
+            logger.debug("Extracting text from PDF (%s, %s)", mode, _describe_source(source))
             
-            # Run in thread pool
             loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(None, _extract_from_pdf)
+            page_count = await loop.run_in_executor(None, _pdf_page_count, source)
+            logger.debug("PDF has %s pages", page_count)
+            if progress:
+                progress({'event': 'pages', 'total': page_count})
             
-            logger.debug(f"Extracted {len(text)} characters from PDF")
-            return text
+            # Fast path: born-digital pages carry their own text
+            start = time.perf_counter()
+            try:
+                text_layer = await loop.run_in_executor(None, _extract_pdf_text_layer, source)
+            except Exception as e:
+                logger.warning("Could not read PDF text layer, falling back to OCR: %s", e)
+                text_layer = []
+            # A text layer over a full-page scan is usually just a header or
+            # footer; those pages are OCR'd anyway
+            scanned_pages = set()
+            if any(_has_text_layer(layer_text) for layer_text in text_layer):
+                try:
+                    scanned_pages = await loop.run_in_executor(None, _pdf_scanned_pages, source)
+                except Exception as e:
+                    logger.warning("Could not list PDF images, trusting the text layer: %s", e)
+            text_layer_ms = (time.perf_counter() - start) * 1000
+            
+            page_texts: Dict[int, str] = {}
+            page_stats: Dict[int, PageStats] = {}
+            
+            def record_page(page_number: int, page_text: str, stats: PageStats):
+                page_texts[page_number] = page_text
+                page_stats[page_number] = stats
+                if progress:
+                    progress(dict(model_to_dict(stats), event='page'))
+            
+            for page_number in range(1, page_count + 1):
+                layer_text = text_layer[page_number - 1] if page_number <= len(text_layer) else ""
+                if _has_text_layer(layer_text) and page_number not in scanned_pages:
+                    record_page(page_number, layer_text, PageStats(
+                        page=page_number,
+                        method='text_layer',
+                        characters=len(layer_text),
+                        duration_ms=text_layer_ms / max(page_count, 1)
+                    ))
+            
+            ocr_pages = [n for n in range(1, page_count + 1) if n not in page_texts]
+            logger.debug(
+                "%s pages read from text layer, %s need OCR", page_count - len(ocr_pages), len(ocr_pages)
+            )
+            
+            def record_ocr_page(page_result: Dict[str, Any]):
+                page_number = page_result.pop('page')
+                page_text = page_result.pop('text')
+                record_page(page_number, page_text, PageStats(
+                    page=page_number,
+                    method='ocr',
+                    characters=len(page_text),
+                    **page_result
+                ))
+            
+            if ocr_pages:
+                if mode == "streaming":
+                    ocr_results = await ocr_executor.run(
+                        _ocr_pdf_streaming, source, ocr_pages, PDF_DPI, PDF_STREAM_WINDOW
+                    )
+                    for page_result in ocr_results:
+                        record_ocr_page(page_result)
+                else:
+                    # Each worker rasterizes and OCRs its own page; pages are
+                    # recorded as they finish and reassembled in order below.
+                    # With several pages the PDF goes to the workers by path,
+                    # not pickled into every task and re-read from stdin
+                    page_source = source
+                    if isinstance(source, bytes) and len(ocr_pages) > 1:
+                        page_source = await spool_to_disk(source, '.pdf')
+                    page_tasks = [
+                        asyncio.ensure_future(ocr_executor.run(_ocr_pdf_page, page_source, page_number, PDF_DPI))
+                        for page_number in ocr_pages
+                    ]
+                    try:
+                        for finished in asyncio.as_completed(page_tasks):
+                            record_ocr_page(await finished)
+                    except BaseException:
+                        # One page failed: stop the rest and wait for them to
+                        # let go of their workers before the spool file goes
+                        for task in page_tasks:
+                            task.cancel()
+                        await asyncio.gather(*page_tasks, return_exceptions=True)
+                        raise
+                    finally:
+                        if page_source is not source:
+                            os.unlink(page_source)
+            
+            text = "".join(
+                f"\n--- Page {page_number} ---\n{page_texts[page_number]}\n"
+                for page_number in range(1, page_count + 1)
+            )
+            
+            logger.debug("Extracted %s characters from PDF", len(text))
+            return text, [page_stats[n] for n in range(1, page_count + 1)]
             
         except Exception as e:
-            logger.error(f"Error extracting text from PDF: {e}")
+            logger.error("Error extracting text from PDF: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=f"Error extracting text from PDF: {str(e)}"
             )
 
+    # Substitutions applied by preprocess_text, in order
+    PREPROCESS_STEPS = [
+        # Remove potential PII
+        (re.compile(r'\b(?:patient|name|date|id|contact|address|phone|ssn)\b[:\s][^\n]*', re.IGNORECASE), ''),
+        # Normalize units
+        (re.compile(r'\b(?:mg/dl|mg%)\b', re.IGNORECASE), 'mg/dL'),
+        # Clean whitespace
+        (re.compile(r'\s+'), ' '),
+    ]
+
     def preprocess_text(self, text: str) -> str:
         """Basic text preprocessing."""
         try:
-            # Remove potential PII
-            text = re.sub(r'\b(?:patient|name|date|id|contact|address|phone|ssn)\b[:\s][^\n]*', '', text, flags=re.IGNORECASE)
-            # Normalize units
-            text = re.sub(r'\b(?:mg/dl|mg%)\b', 'mg/dL', text, flags=re.IGNORECASE)
-            # Clean whitespace
-            text = re.sub(r'\s+', ' ', text)
+            for pattern, replacement in self.PREPROCESS_STEPS:
+                text = pattern.sub(replacement, text)
             text = text.strip()
             return text
         except Exception as e:
-            logger.error(f"Error preprocessing text: {e}")
+            logger.error("Error preprocessing text: %s", e)
             return text
 
+    def preprocess_text_with_offsets(self, text: str) -> tuple:
+        """preprocess_text that also returns the position of each output character in the input."""
+        offsets = list(range(len(text)))
+        for pattern, replacement in self.PREPROCESS_STEPS:
+            text, offsets = sub_with_offsets(pattern, replacement, text, offsets)
+        leading = len(text) - len(text.lstrip())
+        stripped = text.strip()
+        return stripped, offsets[leading:leading + len(stripped)]
+
     def extract_lab_values(self, text: str) -> Dict[str, float]:
-        """Extract lab values using regex patterns."""
-        extracted_values = {}
-        
+        """Extract lab values using the precompiled single-pass extractor."""
         try:
-            for lab_name, lab_info in self.lab_ranges.items():
-                for pattern in lab_info['patterns']:
-                    matches = re.finditer(pattern, text, re.IGNORECASE)
-                    for match in matches:
-                        try:
-                            value = float(match.group(1))
-                            
-                            # Handle unit conversions
-                            if 'unit_conversions' in lab_info:
-                                context = text[max(0, match.start()-50):match.end()+50].lower()
-                                for unit, conversion_factor in lab_info['unit_conversions'].items():
-                                    if unit in context:
-                                        value *= conversion_factor
-                                        break
-                            
-                            extracted_values[lab_name] = value
-                            logger.debug(f"Found {lab_name}: {value}")
-                            break
-                        except (ValueError, IndexError) as e:
-                            logger.debug(f"Error parsing value for {lab_name}: {e}")
-                            continue
-                    if lab_name in extracted_values:
-                        break
-                        
+            return self.lab_extractor.extract(text)
         except Exception as e:
-            logger.error(f"Error extracting lab values: {e}")
-        
-        return extracted_values
+            logger.error("Error extracting lab values: %s", e)
+            return {}
 
     def analyze_lab_values(self, lab_values: Dict[str, float]) -> tuple:
         """Analyze lab values against reference ranges."""
@@ -368,85 +1898,147 @@ class MedicalReportAnalyzer:
         
         try:
             for lab_name, value in lab_values.items():
-                if lab_name not in self.lab_ranges:
+                if lab_name not in self.range_index:
                     continue
-                    
-                lab_info = self.lab_ranges[lab_name]
-                ranges = lab_info['ranges']
                 
-                status = 'unknown'
-                for min_val, max_val, range_status in ranges:
-                    if min_val <= value <= max_val:
-                        status = range_status
-                        break
+                status, matched_ranges, note = self.range_index[lab_name].classify(value)
+                if note:
+                    logger.debug("%s: %s", lab_name, note)
                 
                 detailed_results[lab_name] = LabValue(
                     value=value,
                     status=status,
-                    normal=status in ['normal', 'optimal', 'good', 'normal_female', 'normal_male']
+                    normal=status in NORMAL_STATUSES,
+                    matched_ranges=list(matched_ranges),
+                    note=note
                 )
                 
                 # Add conditions if abnormal
+                lab_info = self.lab_ranges[lab_name]
                 if 'conditions' in lab_info and not detailed_results[lab_name].normal:
                     conditions.extend(lab_info['conditions'])
                     
         except Exception as e:
-            logger.error(f"Error analyzing lab values: {e}")
+            logger.error("Error analyzing lab values: %s", e)
         
         return conditions, detailed_results
 
+    def classify_lab_values_batch(self, lab_columns: Dict[str, List[float]]) -> Dict[str, Dict[str, list]]:
+        """Classify whole columns of lab values (e.g. one column per lab across many reports).
+        
+        Returns, per lab, lists of 'status', 'normal', 'gap' and 'overlap' aligned
+        with the input values. Unknown lab names are skipped.
+        """
+        results = {}
+        for lab_name, values in lab_columns.items():
+            if lab_name not in self.range_index:
+                continue
+            classified = self.range_index[lab_name].classify_many(values)
+            results[lab_name] = {key: column.tolist() for key, column in classified.items()}
+        return results
+
     def extract_diseases_by_keywords(self, text: str) -> tuple:
         """Extract diseases using keyword matching."""
         detected_diseases = []
         confidence_scores = {}
         
         try:
-            for disease, disease_info in self.disease_patterns.items():
-                score = 0
-                
-                # Check keywords
-                for keyword in disease_info['keywords']:
-                    if keyword.lower() in text.lower():
-                        score += 1
+            # One automaton pass finds every keyword present in the text
+            scores = {disease: 0 for disease in self.disease_patterns}
+            for keyword, diseases in self.keyword_automaton.find(text.lower()).items():
+                for disease in diseases:
+                    scores[disease] += 1
+            
+            for disease, compiled_patterns in self.compiled_disease_patterns.items():
+                score = scores[disease]
                 
                 # Check patterns
-                for pattern in disease_info['patterns']:
-                    matches = re.findall(pattern, text, re.IGNORECASE)
-                    score += len(matches) * 2
+                for compiled in compiled_patterns:
+                    score += len(compiled.findall(text)) * 2
                 
                 if score > 0:
                     detected_diseases.append(disease)
                     confidence_scores[disease] = min(score / 3.0, 1.0)
-                    logger.debug(f"Detected {disease} with score {score}")
+                    logger.debug("Detected %s with score %s", disease, score)
                     
         except Exception as e:
-            logger.error(f"Error extracting diseases by keywords: {e}")
+            logger.error("Error extracting diseases by keywords: %s", e)
         
         return detected_diseases, confidence_scores
 
+    def chunk_for_ner(self, text: str) -> List[tuple]:
+        """Split text into token-bounded NER chunks, or [] if the NER model is unavailable."""
+        ner = self.ner_pipeline
+        if ner is None:
+            return []
+        return chunk_text_by_tokens(text, ner.tokenizer, NER_MAX_TOKENS)
+
+    async def extract_entities(self, text: str, offsets: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Run biomedical NER over text, returning entities with document offsets.
+        
+        When text was derived from the document, offsets maps each of its
+        characters back to the document so start/end index the original.
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            # Loads the model on first use, so keep it off the event loop
+            chunks = await loop.run_in_executor(None, self.chunk_for_ner, text)
+            if not chunks:
+                return []
+            chunk_entities = await self.ner_batcher.run([chunk for _, chunk in chunks])
+            
+            entities = []
+            for (offset, _), found in zip(chunks, chunk_entities):
+                for entity in found:
+                    start = int(entity['start']) + offset
+                    end = int(entity['end']) + offset
+                    if offsets is not None and end > start:
+                        start, end = offsets[start], offsets[end - 1] + 1
+                    entities.append({
+                        'entity_group': entity.get('entity_group', entity.get('entity')),
+                        'word': entity['word'],
+                        'score': float(entity['score']),
+                        'start': start,
+                        'end': end
+                    })
+            logger.debug("NER found %s entities in %s chunks", len(entities), len(chunks))
+            return entities
+        except Exception as e:
+            logger.error("Error extracting entities: %s", e)
+            return []
+
     async def analyze_medical_report(self, report_text: str) -> Dict[str, Any]:
         """Main analysis function with comprehensive error handling."""
         try:
-            logger.info("Starting medical report analysis")
+            logger.debug("Starting medical report analysis")
             
-            # Preprocess text
-            cleaned_text = self.preprocess_text(report_text)
-            logger.debug(f"Preprocessed text: {len(cleaned_text)} characters")
+            # Preprocess text; NER needs the map back to report offsets
+            offsets = None
+            if NER_ENABLED:
+                cleaned_text, offsets = self.preprocess_text_with_offsets(report_text)
+            else:
+                cleaned_text = self.preprocess_text(report_text)
+            logger.debug("Preprocessed text: %s characters", len(cleaned_text))
             
             # Extract lab values
-            lab_values = self.extract_lab_values(cleaned_text)
-            logger.debug(f"Found lab values: {list(lab_values.keys())}")
+            with timed_stage('lab_extraction'):
+                lab_values = self.extract_lab_values(cleaned_text)
+            logger.debug("Found lab values: %s", list(lab_values.keys()))
             
             # Analyze lab values
             lab_conditions, lab_details = self.analyze_lab_values(lab_values)
             
             # Extract diseases by keywords
             keyword_diseases, keyword_confidence = self.extract_diseases_by_keywords(cleaned_text)
-            logger.debug(f"Found diseases: {keyword_diseases}")
+            logger.debug("Found diseases: %s", keyword_diseases)
             
             # Combine all conditions
             all_conditions = list(set(lab_conditions + keyword_diseases))
             
+            # Biomedical entities, with offsets into report_text
+            with timed_stage('ner'):
+                entities = await self.extract_entities(cleaned_text, offsets) if NER_ENABLED else []
+            
             # Generate summary
             summary = self.generate_summary(all_conditions, lab_details)
             
@@ -455,17 +2047,16 @@ class MedicalReportAnalyzer:
                 'lab_values': lab_values,
                 'lab_details': lab_details,
                 'keyword_confidence': keyword_confidence,
-                'entities': [],  # Placeholder for now
+                'entities': entities,
                 'summary': summary,
                 'analysis_timestamp': datetime.now().isoformat()
             }
             
-            logger.info("Analysis completed successfully")
+            logger.debug("Analysis completed successfully")
             return results
             
         except Exception as e:
-            logger.error(f"Error in analyze_medical_report: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception("Error in analyze_medical_report: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Analysis failed: {str(e)}"
@@ -492,7 +2083,7 @@ class MedicalReportAnalyzer:
             return " ".join(summary_parts)
             
         except Exception as e:
-            logger.error(f"Error generating summary: {e}")
+            logger.error("Error generating summary: %s", e)
             return "Analysis completed. Please consult with a healthcare provider for interpretation."
 
 # Initialize the analyzer
@@ -500,9 +2091,189 @@ try:
     analyzer = MedicalReportAnalyzer()
     logger.info("Analyzer initialized successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize analyzer: {e}")
+    logger.error("Failed to initialize analyzer: %s", e)
     analyzer = None
 
+analysis_cache = AnalysisCache(db_path=ANALYSIS_CACHE_DB)
+
+class AnalysisJob:
+    """State and progress events of one queued analysis."""
+    
+    def __init__(self, job_id: str, filename: str, content: bytes, digest: Optional[str] = None):
+        self.job_id = job_id
+        self.filename = filename
+        self.content: Optional[bytes] = content
+        self.digest = digest
+        self.status = 'queued'
+        self.submitted_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.pages_total: Optional[int] = None
+        self.pages_done = 0
+        self.result: Optional[AnalysisResult] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+    
+    def publish(self, event: Dict[str, Any]):
+        """Record a progress event and wake up event stream readers."""
+        if event.get('event') == 'pages':
+            self.pages_total = event['total']
+        elif event.get('event') == 'page':
+            self.pages_done += 1
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def iter_events(self):
+        """Yield every event of the job, waiting for new ones until it finishes."""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+class JobQueue:
+    """Bounded in-process queue of analysis jobs drained by a fixed set of workers."""
+    
+    def __init__(self, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE,
+                 result_ttl_seconds: float = JOB_RESULT_TTL_SECONDS):
+        self.workers = workers
+        self.max_size = max_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+            logger.info("Started job queue with %s workers", self.workers)
+    
+    async def stop(self):
+        """Cancel the worker tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+    
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    def submit(self, filename: str, content: bytes, digest: Optional[str] = None) -> AnalysisJob:
+        """Queue a document for analysis, or raise 503 if the queue is full."""
+        self.start()
+        self._expire_finished()
+        job = AnalysisJob(uuid.uuid4().hex, filename, content, digest)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Analysis queue is full. Please retry later.",
+                headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)}
+            )
+        self.jobs[job.job_id] = job
+        job.publish({'event': 'queued'})
+        return job
+    
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self.jobs.get(job_id)
+    
+    def queue_position(self, job: AnalysisJob) -> Optional[int]:
+        """1-based position among queued jobs, or None once the job has started."""
+        if job.status != 'queued':
+            return None
+        position = 1
+        for other in self.jobs.values():
+            if other is job:
+                return position
+            if other.status == 'queued':
+                position += 1
+        return None
+    
+    def _expire_finished(self):
+        cutoff = datetime.now().timestamp() - self.result_ttl_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished and job.finished_at.timestamp() < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                job.status = 'running'
+                job.started_at = datetime.now()
+                job.publish({'event': 'started'})
+                job.result = await process_report(
+                    job.filename, job.content, progress=job.publish, digest=job.digest
+                )
+                job.status = 'completed'
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                job.error = str(e.detail)
+                job.status = 'failed'
+            except Exception as e:
+                logger.error("Job %s failed: %s", job.job_id, e)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.content = None
+                job.finished_at = datetime.now()
+                if job.finished:
+                    job.publish({'event': job.status, 'error': job.error})
+                self._queue.task_done()
+    
+    def to_response(self, job: AnalysisJob) -> JobStatusResponse:
+        return JobStatusResponse(
+            job_id=job.job_id,
+            status=job.status,
+            filename=job.filename,
+            submitted_at=job.submitted_at.isoformat(),
+            started_at=job.started_at.isoformat() if job.started_at else None,
+            finished_at=job.finished_at.isoformat() if job.finished_at else None,
+            queue_position=self.queue_position(job),
+            pages_total=job.pages_total,
+            pages_done=job.pages_done,
+            result=job.result,
+            error=job.error
+        )
+
+job_queue = JobQueue()
+
+if prometheus_client is not None:
+    prometheus_client.Gauge(
+        'report_analyzer_ocr_tasks_in_flight', 'OCR tasks queued or running'
+    ).set_function(lambda: ocr_executor.in_flight)
+    prometheus_client.Gauge(
+        'report_analyzer_ocr_queue_depth', 'OCR tasks waiting for a free worker'
+    ).set_function(lambda: ocr_executor.queue_depth)
+    prometheus_client.Gauge(
+        'report_analyzer_ocr_rejected', 'Requests turned away because the OCR backlog was full'
+    ).set_function(lambda: ocr_executor.rejected)
+    prometheus_client.Gauge(
+        'report_analyzer_job_queue_depth', 'Background jobs waiting for a worker'
+    ).set_function(lambda: job_queue.depth)
+    prometheus_client.Gauge(
+        'report_analyzer_cache_hit_ratio', 'Analysis cache hit ratio since startup'
+    ).set_function(lambda: analysis_cache.stats()['hit_ratio'])
+
 # API Routes
 
 @app.get("/", response_model=Dict[str, str])
@@ -512,123 +2283,487 @@ async def root():
         "message": "Medical Report Analyzer API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "batch": "/analyze/batch",
+        "jobs": "/jobs",
+        "metrics": "/metrics"
     }
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint."""
+async def health_check(warmup: bool = False):
+    """Health check endpoint. Pass ?warmup=true to load the NLP models now."""
+    if warmup and analyzer:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, analyzer.warm_up_models)
     return HealthResponse(
         status="healthy",
         message="Medical Report Analyzer API is running",
         tesseract_available=tesseract_found,
-        analyzer_ready=analyzer is not None
+        analyzer_ready=analyzer is not None,
+        models_loaded=analyzer.models_loaded() if analyzer else {}
     )
 
-@app.post("/analyze", response_model=APIResponse)
-async def analyze_report(file: UploadFile = File(...)):
-    """Main endpoint to analyze medical reports."""
+async def cached_report(filename: str, digest: str) -> Optional[AnalysisResult]:
+    """Return the cached analysis of a document by its SHA-256 hex digest, or None."""
+    cached = await analysis_cache.get(AnalysisCache.make_key(digest))
+    if CACHE_LOOKUPS is not None:
+        CACHE_LOOKUPS.labels(result='hit' if cached is not None else 'miss').inc()
+    if cached is None:
+        return None
+    logger.info("Cache hit for %s", filename)
+    return AnalysisResult(**dict(cached['result'], filename=filename, cached=True))
+
+async def process_report(filename: str, content: bytes,
+                         progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                         digest: Optional[str] = None, check_cache: bool = True) -> AnalysisResult:
+    """Extract and analyze one uploaded document, using the result cache.
+    
+    progress receives the page events emitted during text extraction. digest is
+    the SHA-256 of content when read_upload already computed it. Pass
+    check_cache=False when the caller has already looked the digest up.
+    """
+    file_type = Path(filename).suffix.lstrip('.').lower() or 'unknown'
+    current_file_type.set(file_type)
+    
+    # Serve repeat uploads of the same document from the cache
+    digest = digest or hashlib.sha256(content).hexdigest()
+    cache_key = AnalysisCache.make_key(digest)
+    if check_cache:
+        cached = await cached_report(filename, digest)
+        if cached is not None:
+            return cached
+    
+    start = time.perf_counter()
+    temp_path = None
     try:
-        logger.info(f"Received analysis request for file: {file.filename}")
+        # Small documents are processed straight from the upload buffer; only
+        # large ones are spooled to disk so workers don't each receive a copy
+        source: Union[bytes, str] = content
+        if len(content) > UPLOAD_SPOOL_THRESHOLD:
+            temp_path = await spool_to_disk(content, Path(filename).suffix)
+            source = temp_path
         
-        # Check if analyzer is available
-        if not analyzer:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Analyzer not properly initialized"
-            )
+        # Extract text based on file type
+        with timed_stage('text_extraction'):
+            if filename.lower().endswith('.pdf'):
+                logger.debug("Extracting text from PDF")
+                report_text, page_stats = await analyzer.extract_text_from_pdf(source, progress=progress)
+            else:
+                logger.debug("Extracting text from image")
+                report_text, page_stats = await analyzer.extract_text_from_image(source, progress=progress)
+        # Worker-side timings, summed over the OCR'd pages
+        for stats in page_stats:
+            if stats.rasterize_ms is not None:
+                record_stage('rasterize', stats.rasterize_ms / 1000)
+            if stats.preprocess_ms:
+                record_stage('preprocess', sum(stats.preprocess_ms.values()) / 1000)
+            if stats.ocr_ms is not None:
+                record_stage('ocr', stats.ocr_ms / 1000)
         
-        # Check file size
-        if file.size and file.size > MAX_FILE_SIZE:
+        # Check if text was extracted
+        if not report_text or not report_text.strip():
             raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024 * 1024)}MB"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No text could be extracted from the file. Please check the file quality and format."
             )
         
-        # Check file extension
-        if not file.filename or not allowed_file(file.filename):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File type not allowed. Please upload PDF, PNG, JPG, JPEG, TIFF, or BMP files."
+        logger.debug("Extracted %s characters", len(report_text))
+        
+        # Analyze the report
+        with timed_stage('analysis'):
+            results = await analyzer.analyze_medical_report(report_text)
+        
+        # Add metadata
+        results['filename'] = filename
+        results['extracted_text_length'] = len(report_text)
+        results['page_stats'] = page_stats
+        
+        logger.info("Analyzed %s in %.0f ms", filename, (time.perf_counter() - start) * 1000)
+        
+        # Convert to Pydantic model
+        analysis_result = AnalysisResult(**results)
+        analysis_cache.set(cache_key, report_text, model_to_dict(analysis_result))
+        if DOCUMENT_DURATION is not None:
+            DOCUMENT_DURATION.labels(file_type=file_type, pages=page_count_label(len(page_stats))).observe(
+                time.perf_counter() - start
             )
         
-        # Create secure filename
-        filename = file.filename
-        logger.info(f"Processing file: {filename}")
+        return analysis_result
         
-        # Create temporary file
-        temp_path = None
-        try:
-            # Read file content
-            content = await file.read()
-            
-            # Create temporary file with proper extension
-            suffix = Path(filename).suffix
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-                temp_path = temp_file.name
-                # Write content to temporary file using aiofiles properly
-                async with aiofiles.open(temp_path, 'wb') as f:
-                    await f.write(content)
-                logger.debug(f"Saved temp file: {temp_path}")
-            
-            # Extract text based on file type
-            if filename.lower().endswith('.pdf'):
-                logger.info("Extracting text from PDF")
-                report_text = await analyzer.extract_text_from_pdf(temp_path)
-            else:
-                logger.info("Extracting text from image")
-                report_text = await analyzer.extract_text_from_image(temp_path)
-            
-            # Check if text was extracted
-            if not report_text or not report_text.strip():
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error processing file %s: %s", filename, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Analysis failed: {str(e)}"
+        )
+        
+    finally:
+        # Clean up temporary file
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+                logger.debug("Cleaned up temp file: %s", temp_path)
+            except Exception as e:
+                logger.warning("Could not clean up temp file: %s", e)
+
+def check_analyzer_ready():
+    """Raise if the analyzer failed to initialize."""
+    if not analyzer:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Analyzer not properly initialized"
+        )
+
+def check_document(filename: Optional[str], size: Optional[int]):
+    """Validate an uploaded document's name and size."""
+    # Check file size
+    if size and size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024 * 1024)}MB"
+        )
+    
+    # Check file extension
+    if not filename or not allowed_file(filename):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File type not allowed. Please upload PDF, PNG, JPG, JPEG, TIFF, or BMP files."
+        )
+
+def payload_too_large(max_size: int, detail: Optional[str] = None) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=detail or f"File size exceeds maximum allowed size of {max_size / (1024 * 1024)}MB"
+    )
+
+async def read_upload(upload: UploadFile, max_size: int = MAX_FILE_SIZE,
+                      detail: Optional[str] = None) -> tuple:
+    """Read an upload in chunks, returning (content, SHA-256 hex digest).
+    
+    The digest is computed as the chunks arrive and doubles as the cache key.
+    Reading stops with a 413 as soon as more than max_size bytes have been read.
+    """
+    start = time.perf_counter()
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise payload_too_large(max_size, detail)
+        hasher.update(chunk)
+        chunks.append(chunk)
+    record_stage('upload', time.perf_counter() - start)
+    return b"".join(chunks), hasher.hexdigest()
+
+class RequestBudgetMiddleware:
+    """ASGI middleware enforcing per-request body size and upload time budgets.
+    
+    The declared Content-Length is checked before any of the body is read and
+    the bytes actually received are counted as they arrive, so an oversized or
+    slow upload is cut off before the multipart parser has buffered all of it.
+    Violations are raised from receive() as HTTPExceptions and reach the client
+    through the regular exception handler.
+    """
+    
+    def __init__(self, app, budgets: Dict[str, int], default_budget: int, time_budget_seconds: float):
+        self.app = app
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.time_budget_seconds = time_budget_seconds
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('POST', 'PUT', 'PATCH'):
+            await self.app(scope, receive, send)
+            return
+        
+        max_bytes = self.budgets.get(scope['path'], self.default_budget)
+        declared = dict(scope['headers']).get(b'content-length')
+        loop = asyncio.get_event_loop()
+        deadline = None
+        received = 0
+        body_done = False
+        
+        async def limited_receive():
+            nonlocal deadline, received, body_done
+            if body_done:
+                # Past the body only disconnect messages arrive; no budget applies
+                return await receive()
+            if deadline is None:
+                if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+                    raise payload_too_large(max_bytes, "Request body is too large")
+                deadline = loop.time() + self.time_budget_seconds
+            try:
+                message = await asyncio.wait_for(receive(), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No text could be extracted from the file. Please check the file quality and format."
+                    status_code=status.HTTP_408_REQUEST_TIMEOUT,
+                    detail=f"Upload did not complete within {self.time_budget_seconds:g} seconds"
                 )
-            
-            logger.info(f"Extracted {len(report_text)} characters")
-            
-            # Analyze the report
-            results = await analyzer.analyze_medical_report(report_text)
-            
-            # Add metadata
-            results['filename'] = filename
-            results['extracted_text_length'] = len(report_text)
-            
-            logger.info("Analysis completed successfully")
-            
-            # Convert to Pydantic model
-            analysis_result = AnalysisResult(**results)
-            
-            return APIResponse(success=True, data=analysis_result)
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error processing file: {e}")
-            logger.error(traceback.format_exc())
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Analysis failed: {str(e)}"
-            )
-            
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_bytes:
+                    raise payload_too_large(max_bytes, "Request body is too large")
+                body_done = not message.get('more_body', False)
+            else:
+                body_done = True
+            if body_done:
+                record_stage('receive', loop.time() - (deadline - self.time_budget_seconds))
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+class MetricsMiddleware:
+    """ASGI middleware counting in-flight requests and adding a Server-Timing header.
+    
+    The header lists the stages recorded with record_stage while the request
+    was handled, plus the total. OCR stages are summed over pages, so with
+    parallel page OCR they can add up to more than the total.
+    """
+    
+    def __init__(self, app, tracked_paths: List[str]):
+        self.app = app
+        self.tracked_paths = set(tracked_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        file_type_token = current_file_type.set('unknown')
+        start = time.perf_counter()
+        in_flight = None
+        if REQUESTS_IN_FLIGHT is not None and scope['path'] in self.tracked_paths:
+            in_flight = REQUESTS_IN_FLIGHT.labels(path=scope['path'])
+            in_flight.inc()
+        
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start' and SERVER_TIMING_ENABLED:
+                entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get('headers', [])) + [(b'server-timing', ", ".join(entries).encode('latin-1'))]
+                message = dict(message, headers=headers)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
         finally:
-            # Clean up temporary file
-            if temp_path:
-                try:
-                    os.unlink(temp_path)
-                    logger.debug(f"Cleaned up temp file: {temp_path}")
-                except Exception as e:
-                    logger.warning(f"Could not clean up temp file: {e}")
-                
+            if in_flight is not None:
+                in_flight.dec()
+            request_timings.reset(token)
+            current_file_type.reset(file_type_token)
+
+app.add_middleware(
+    RequestBudgetMiddleware,
+    budgets={
+        '/analyze': MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES,
+        '/jobs': MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES,
+        '/analyze/batch': BATCH_MAX_TOTAL_SIZE + MULTIPART_OVERHEAD_BYTES,
+    },
+    default_budget=MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES,
+    time_budget_seconds=UPLOAD_TIME_BUDGET_SECONDS
+)
+app.add_middleware(MetricsMiddleware, tracked_paths=['/analyze', '/analyze/batch', '/jobs'])
+
+@app.post("/analyze", response_model=APIResponse)
+async def analyze_report(file: UploadFile = File(...)):
+    """Main endpoint to analyze medical reports."""
+    try:
+        logger.info("Received analysis request for file: %s", file.filename)
+        
+        # Check if analyzer is available
+        check_analyzer_ready()
+        check_document(file.filename, file.size)
+        
+        # Create secure filename
+        filename = file.filename
+        logger.debug("Processing file: %s", filename)
+        
+        # Read file content, hashing it as it streams in
+        content, digest = await read_upload(file)
+        
+        # Cache hits need no OCR, so only a miss takes an OCR slot, held until
+        # the analysis is done
+        analysis_result = await cached_report(filename, digest)
+        if analysis_result is None:
+            with ocr_executor.admit():
+                analysis_result = await process_report(filename, content, digest=digest, check_cache=False)
+        with timed_stage('serialize'):
+            response = JSONResponse(content=jsonable_encoder(APIResponse(success=True, data=analysis_result)))
+        return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Unexpected error in analyze_report: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Unexpected error in analyze_report: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Server error: {str(e)}"
         )
 
+def expand_zip_upload(zip_name: str, content: bytes) -> List[tuple]:
+    """List (filename, loader) pairs for the documents inside a zip upload.
+    
+    Each loader returns (content, digest) with digest None. Entries are
+    decompressed lazily by their loader so a large archive is not
+    expanded in memory all at once. Both this and the loaders block, so
+    callers run them in an executor.
+    """
+    archive = zipfile.ZipFile(io.BytesIO(content))
+    documents = []
+    for info in archive.infolist():
+        if info.is_dir() or not allowed_file(info.filename):
+            continue
+        filename = f"{zip_name}/{info.filename}"
+        
+        def load(info=info):
+            check_document(info.filename, info.file_size)
+            return archive.read(info), None
+        documents.append((filename, load))
+    return documents
+
+async def read_batch_uploads(files: List[UploadFile]) -> List[tuple]:
+    """List a batch upload as (filename, loader) pairs, expanding zip archives.
+    
+    Each loader is a coroutine function returning (content, digest). Plain
+    uploads are read by their loader, so at most BATCH_MAX_CONCURRENCY of them
+    are in memory at once; only zip archives are read here, to list their
+    members. The total size is checked up front from the sizes the multipart
+    parser recorded.
+    """
+    total_size = sum(upload.size or 0 for upload in files)
+    if total_size > BATCH_MAX_TOTAL_SIZE:
+        raise payload_too_large(
+            BATCH_MAX_TOTAL_SIZE,
+            f"Batch exceeds maximum total size of {BATCH_MAX_TOTAL_SIZE / (1024 * 1024)}MB"
+        )
+    
+    loop = asyncio.get_event_loop()
+    documents = []
+    for upload in files:
+        filename = upload.filename or "upload"
+        if filename.lower().endswith('.zip'):
+            content, _ = await read_upload(upload, BATCH_MAX_TOTAL_SIZE)
+            try:
+                members = await loop.run_in_executor(None, expand_zip_upload, filename, content)
+            except zipfile.BadZipFile:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Could not read zip archive: {filename}"
+                )
+            for member_name, load_member in members:
+                # Zip members are decompressed off the event loop
+                async def load(load_member=load_member):
+                    return await loop.run_in_executor(None, load_member)
+                documents.append((member_name, load))
+        else:
+            async def load(upload=upload):
+                return await read_upload(upload)
+            documents.append((filename, load))
+    
+    if len(documents) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch contains {len(documents)} files; the maximum is {BATCH_MAX_FILES}"
+        )
+    return documents
+
+@app.post("/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """Analyze many reports (or zip archives of reports) in one request.
+    
+    Files are processed concurrently, up to BATCH_MAX_CONCURRENCY at a time, and
+    each result is streamed back as one NDJSON line (a BatchItemResponse) as soon
+    as it finishes, so lines arrive in completion order, not upload order.
+    """
+    check_analyzer_ready()
+    # One OCR slot covers the whole batch; items beyond the one whose OCR
+    # runs on it wait for slots of their own
+    slot = ocr_executor.admit()
+    try:
+        documents = await read_batch_uploads(files)
+    except BaseException:
+        slot.release()
+        raise
+    logger.info("Received batch of %s documents", len(documents))
+    
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    
+    async def analyze_one(index: int, filename: str, load) -> BatchItemResponse:
+        # Each item runs in its own task, so this only affects the item
+        current_ocr_slot.set(slot)
+        async with semaphore:
+            try:
+                # Each item is read (or decompressed) only once it gets its turn
+                content, digest = await load()
+                check_document(filename, len(content))
+                analysis_result = await process_report(filename, content, digest=digest)
+                return BatchItemResponse(index=index, filename=filename, success=True, data=analysis_result)
+            except HTTPException as e:
+                return BatchItemResponse(index=index, filename=filename, success=False, error=str(e.detail))
+            except Exception as e:
+                logger.error("Error in batch item %s: %s", filename, e)
+                return BatchItemResponse(index=index, filename=filename, success=False, error=str(e))
+    
+    async def stream_results():
+        tasks = [
+            asyncio.ensure_future(analyze_one(index, filename, load))
+            for index, (filename, load) in enumerate(documents)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                yield json.dumps(model_to_dict(item)) + "\n"
+        finally:
+            # Client went away: drop the work that has not started yet
+            for task in tasks:
+                task.cancel()
+            slot.release()
+    
+    # The background task releases the slot if the stream never started
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson",
+                             background=BackgroundTask(slot.release))
+
+@app.post("/jobs", response_model=JobStatusResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(file: UploadFile = File(...)):
+    """Queue a report for background analysis and return its job id immediately."""
+    check_analyzer_ready()
+    check_document(file.filename, file.size)
+    content, digest = await read_upload(file)
+    
+    job = job_queue.submit(file.filename, content, digest)
+    logger.info("Queued job %s for file: %s", job.job_id, file.filename)
+    return job_queue.to_response(job)
+
+def get_job_or_404(job_id: str) -> AnalysisJob:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Poll the status, progress and result of a job."""
+    return job_queue.to_response(get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream a job's progress (queued, started, per-page, completed/failed) as server-sent events."""
+    job = get_job_or_404(job_id)
+    
+    async def event_stream():
+        async for event in job.iter_events():
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/supported-formats", response_model=SupportedFormatsResponse)
 async def get_supported_formats():
     """Get list of supported file formats."""
@@ -639,18 +2774,63 @@ async def get_supported_formats():
         tesseract_available=tesseract_found
     )
 
+@app.get("/cache/stats", response_model=CacheStatsResponse)
+async def get_cache_stats():
+    """Get analysis result cache hit/miss counters."""
+    return CacheStatsResponse(**analysis_cache.stats())
+
+async def unload_idle_models_periodically():
+    """Background task that unloads NLP models left idle past MODEL_IDLE_TIMEOUT_SECONDS."""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(MODEL_IDLE_CHECK_INTERVAL_SECONDS)
+        try:
+            await loop.run_in_executor(None, analyzer.unload_idle_models, MODEL_IDLE_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning("Idle model check failed: %s", e)
+
+@app.get("/metrics")
+async def metrics():
+    """Expose pipeline stage timings, queue depths and cache hit ratio in Prometheus format."""
+    if prometheus_client is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Metrics are unavailable: prometheus_client is not installed"
+        )
+    return Response(prometheus_client.generate_latest(), media_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+@app.get("/ocr/stats", response_model=OCRStatsResponse)
+async def get_ocr_stats():
+    """Get OCR worker pool load and queue depth."""
+    return OCRStatsResponse(**ocr_executor.stats())
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background job workers and the idle model unloader."""
+    job_queue.start()
+    if analyzer and MODEL_IDLE_TIMEOUT_SECONDS > 0:
+        app.state.model_unloader = asyncio.ensure_future(unload_idle_models_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools on shutdown."""
+    if getattr(app.state, "model_unloader", None):
+        app.state.model_unloader.cancel()
+    await job_queue.stop()
+    ocr_executor.shutdown()
+
 # Exception handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"success": False, "error": exc.detail}
+        content={"success": False, "error": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}")
-    logger.error(traceback.format_exc())
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"success": False, "error": "Internal server error"}
@@ -665,6 +2845,10 @@ if __name__ == "__main__":
     print(f"Supported formats: {', '.join(ALLOWED_EXTENSIONS)}")
     print(f"Max file size: {MAX_FILE_SIZE / (1024 * 1024)}MB")
     print(f"Tesseract OCR: {'Available' if tesseract_found else 'NOT FOUND'}")
+    print(f"OCR workers: {OCR_MAX_WORKERS} (PDF mode: {PDF_OCR_MODE})")
+    print(f"OCR preprocessing: {', '.join(OCR_PREPROCESS_STAGES) or 'off'}")
+    print(f"Prometheus metrics: {'/metrics' if prometheus_client else 'disabled (prometheus_client not installed)'}")
+    print(f"Logging: {LOG_LEVEL} ({LOG_FORMAT}), DEBUG sample rate {LOG_DEBUG_SAMPLE_RATE:g}")
     print(f"Analyzer: {'Ready' if analyzer else 'FAILED TO INITIALIZE'}")
     print("API will be available at: http://localhost:8000")
     print("API Documentation: http://localhost:8000/docs")
@@ -683,6 +2867,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8002,
         reload=True,
-        log_level="info"
+        log_level=LOG_LEVEL.lower(),
+        log_config=None  # uvicorn's loggers propagate to the queued root handler
     )
     # uvicorn app:app --host 0.0.0.0 --port 8002
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+Parity check and benchmark for the clinical model inference backends.
+
+Runs the clinical classifier and the biomedical NER pipeline with both the
+PyTorch backend and the quantized ONNX Runtime backend on the same corpus,
+checks that their outputs agree, and reports latency and memory per backend.
+
+Bio_ClinicalBERT has no trained classification head, and transformers
+initialises a fresh random one on every load. The classifier is therefore
+saved once to a temporary checkpoint and both backends load that, so the
+parity check compares the same weights in fp32 and int8.
+
+The corpus is every .txt file in --corpus (one report per file), or a small
+built-in set of report snippets when no directory is given.
+
+Usage (from the backend directory, with optimum[onnxruntime] installed):
+    python benchmarks/bench_inference_backends.py [--corpus reports/] [--repeat 5]
+
+Exits with status 1 if the backends disagree beyond the tolerances.
+"""
+import argparse
+import gc
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LazyPipeline, chunk_text_by_tokens, NER_MAX_TOKENS, ONNX_MODEL_DIR  # noqa: E402
+
+MODELS = {
+    'classifier': ("Clinical BERT", "text-classification", "emilyalsentzer/Bio_ClinicalBERT", {}),
+    'ner': ("NER pipeline", "ner", "d4data/biomedical-ner-all", {'aggregation_strategy': "simple"}),
+}
+
+# Models whose checkpoint lacks a trained head for their task; see pin_checkpoint
+UNTRAINED_HEADS = {'classifier'}
+
+BUILTIN_CORPUS = [
+    "Fasting glucose 132 mg/dL and HbA1c 7.1 consistent with type 2 diabetes mellitus. Continue metformin 500 mg.",
+    "Hemoglobin 10.2 g/dL, low ferritin, findings suggest iron deficiency anemia. Start oral iron supplementation.",
+    "Blood pressure 150/95 on two visits, stage 2 hypertension. Lisinopril 10 mg daily prescribed.",
+    "Total cholesterol 245, LDL 168, HDL 38. Hyperlipidemia with elevated cardiovascular risk; atorvastatin advised.",
+    "Creatinine 1.8 mg/dL with reduced eGFR, suggestive of chronic kidney disease stage 3. Nephrology referral.",
+    "Patient reports chest pain radiating to the left arm with shortness of breath; ECG shows ST elevation.",
+]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return float('nan')
+
+
+def pin_checkpoint(key, directory):
+    """Save the model with its initialised head to directory, so every load gets the same weights."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoModelForTokenClassification, AutoTokenizer
+
+    _, task, model, _ = MODELS[key]
+    model_class = AutoModelForSequenceClassification if task == "text-classification" else AutoModelForTokenClassification
+    torch.manual_seed(0)
+    model_class.from_pretrained(model).save_pretrained(directory)
+    AutoTokenizer.from_pretrained(model).save_pretrained(directory)
+    return directory
+
+
+def load_corpus(corpus_dir):
+    if not corpus_dir:
+        return BUILTIN_CORPUS
+    texts = [path.read_text(encoding='utf-8', errors='replace') for path in sorted(Path(corpus_dir).glob("*.txt"))]
+    if not texts:
+        sys.exit(f"No .txt reports found in {corpus_dir}")
+    return texts
+
+
+def run_backend(key, backend, corpus, repeat, model):
+    """Load one model with one backend and time it over the corpus."""
+    name, task, _, kwargs = MODELS[key]
+    gc.collect()
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    lazy = LazyPipeline(name, task, model, backend=backend, **kwargs)
+    pipe = lazy.get()
+    if pipe is None:
+        sys.exit(f"Could not load {name} with the {backend} backend")
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    inputs = []
+    for text in corpus:
+        inputs.extend(chunk for _, chunk in chunk_text_by_tokens(text, pipe.tokenizer, NER_MAX_TOKENS))
+
+    outputs = pipe(inputs)
+    latencies = []
+    for _ in range(repeat):
+        for chunk in inputs:
+            start = time.perf_counter()
+            pipe(chunk)
+            latencies.append((time.perf_counter() - start) * 1000)
+    stats = {
+        'load_s': load_seconds,
+        'rss_model_mb': rss_loaded - rss_before,
+        'rss_peak_mb': current_rss_mb(),
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0],
+    }
+    del pipe, lazy
+    gc.collect()
+    return outputs, stats
+
+
+def classifier_parity(reference, candidate, score_tolerance):
+    """Fraction of identical labels and the largest score difference."""
+    same_label = sum(r['label'] == c['label'] for r, c in zip(reference, candidate))
+    max_diff = max(abs(r['score'] - c['score']) for r, c in zip(reference, candidate))
+    return same_label / len(reference), max_diff, max_diff <= score_tolerance
+
+
+def ner_parity(reference, candidate):
+    """Entity-level F1 of the candidate spans against the reference spans."""
+    ref = {(i, e['entity_group'], e['start'], e['end']) for i, ents in enumerate(reference) for e in ents}
+    cand = {(i, e['entity_group'], e['start'], e['end']) for i, ents in enumerate(candidate) for e in ents}
+    if not ref and not cand:
+        return 1.0
+    true_positives = len(ref & cand)
+    precision = true_positives / len(cand) if cand else 0.0
+    recall = true_positives / len(ref) if ref else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of .txt reports")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes over the corpus")
+    parser.add_argument("--models", default="classifier,ner", help="comma separated: classifier, ner")
+    parser.add_argument("--score-tolerance", type=float, default=0.05, help="max classifier score difference")
+    parser.add_argument("--min-ner-f1", type=float, default=0.9, help="min NER entity F1 against PyTorch")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    failed = False
+    for key in args.models.split(','):
+        outputs, stats = {}, {}
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            model = pin_checkpoint(key, checkpoint_dir) if key in UNTRAINED_HEADS else MODELS[key][2]
+            try:
+                for backend in ("pytorch", "onnx"):
+                    outputs[backend], stats[backend] = run_backend(key, backend, corpus, args.repeat, model)
+            finally:
+                if model == checkpoint_dir:
+                    # The ONNX export of a throwaway checkpoint is not worth keeping
+                    shutil.rmtree(os.path.join(ONNX_MODEL_DIR, model.replace('/', '__')), ignore_errors=True)
+
+        print(f"\n== {MODELS[key][0]} ({len(outputs['pytorch'])} chunks) ==")
+        print(f"{'backend':>8} {'load s':>7} {'model MB':>9} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for backend, s in stats.items():
+            print(f"{backend:>8} {s['load_s']:>7.1f} {s['rss_model_mb']:>9.0f} {s['rss_peak_mb']:>8.0f} "
+                  f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f}")
+        speedup = stats['pytorch']['p50_ms'] / stats['onnx']['p50_ms']
+        print(f"ONNX p50 speedup: {speedup:.2f}x")
+
+        if key == 'classifier':
+            agreement, max_diff, ok = classifier_parity(outputs['pytorch'], outputs['onnx'], args.score_tolerance)
+            print(f"Parity: {agreement:.1%} labels identical, max score difference {max_diff:.4f}")
+        else:
+            f1 = ner_parity(outputs['pytorch'], outputs['onnx'])
+            ok = f1 >= args.min_ner_f1
+            print(f"Parity: entity F1 {f1:.3f} against PyTorch")
+        if not ok:
+            print("PARITY CHECK FAILED")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark for lab value extraction.
+
+Compares the precompiled LabValueExtractor used by MedicalReportAnalyzer with
+the original pattern-by-pattern finditer loop on synthetic reports, and checks
+that both return identical values.
+
+Usage (from the backend directory):
+    python benchmarks/bench_lab_extraction.py [--reports 2000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import analyzer, LabValueExtractor  # noqa: E402
+
+FILLER_WORDS = (
+    "the patient was seen for routine follow up results reviewed within reference "
+    "interval report lab sample collected fasting described chronic history"
+).split()
+
+LAB_LINES = [
+    lambda r: f"Glucose:{r.randint(60, 200)} mg/dL",
+    lambda r: f"glucose {r.uniform(3, 12):.1f} mmol/l",
+    lambda r: f"FBS {r.randint(60, 200)}",
+    lambda r: f"HbA1c {r.uniform(4, 9):.1f}",
+    lambda r: f"total cholesterol {r.randint(120, 300)}",
+    lambda r: f"LDL {r.randint(50, 220)}",
+    lambda r: f"HDL:{r.randint(20, 90)}",
+    lambda r: f"BP {r.randint(100, 190)}/{r.randint(60, 120)}",
+    lambda r: f"systolic {r.randint(90, 200)} diastolic {r.randint(60, 120)}",
+    lambda r: f"Hb {r.uniform(8, 18):.1f}",
+    lambda r: f"Creatinine {r.uniform(0.5, 4):.2f}",
+    lambda r: f"cr {r.uniform(0.5, 4):.1f}",
+]
+
+
+def legacy_extract_lab_values(lab_ranges, text):
+    """The original extract_lab_values loop, kept as the reference implementation."""
+    extracted_values = {}
+    for lab_name, lab_info in lab_ranges.items():
+        for pattern in lab_info['patterns']:
+            for match in re.finditer(pattern, text, re.IGNORECASE):
+                try:
+                    value = float(match.group(1))
+                    if 'unit_conversions' in lab_info:
+                        context = text[max(0, match.start() - 50):match.end() + 50].lower()
+                        for unit, conversion_factor in lab_info['unit_conversions'].items():
+                            if unit in context:
+                                value *= conversion_factor
+                                break
+                    extracted_values[lab_name] = value
+                    break
+                except (ValueError, IndexError):
+                    continue
+            if lab_name in extracted_values:
+                break
+    return extracted_values
+
+
+def make_report(rng, lines, lab_probability=0.3):
+    """Build a synthetic report of filler sentences with lab results mixed in."""
+    parts = []
+    for _ in range(lines):
+        parts.append(" ".join(rng.choice(FILLER_WORDS) for _ in range(12)))
+        if rng.random() < lab_probability:
+            parts.append(rng.choice(LAB_LINES)(rng))
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=2000, help="random reports for the parity check")
+    parser.add_argument("--repeat", type=int, default=200, help="timing iterations per report size")
+    args = parser.parse_args()
+
+    if analyzer is None:
+        sys.exit("Analyzer failed to initialize")
+    lab_ranges = analyzer.lab_ranges
+    extractor = LabValueExtractor(lab_ranges)
+
+    # Parity: the new engine must return exactly what the old loop returned
+    mismatches = 0
+    for seed in range(args.reports):
+        rng = random.Random(seed)
+        text = make_report(rng, rng.randint(1, 40))
+        if extractor.extract(text) != legacy_extract_lab_values(lab_ranges, text):
+            mismatches += 1
+    print(f"Parity: {args.reports - mismatches}/{args.reports} reports identical")
+
+    print(f"{'chars':>8} {'labs':>5} {'legacy (us)':>12} {'extractor (us)':>15} {'speedup':>8}")
+    for lines, lab_probability in [(5, 0.3), (50, 0.3), (400, 0.3), (400, 0.0)]:
+        text = make_report(random.Random(1), lines, lab_probability)
+        legacy_us = timeit.timeit(lambda: legacy_extract_lab_values(lab_ranges, text), number=args.repeat) / args.repeat * 1e6
+        new_us = timeit.timeit(lambda: extractor.extract(text), number=args.repeat) / args.repeat * 1e6
+        print(f"{len(text):>8} {'yes' if lab_probability else 'no':>5} {legacy_us:>12.1f} {new_us:>15.1f} {legacy_us / new_us:>7.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
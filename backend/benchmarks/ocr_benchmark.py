@@ -0,0 +1,282 @@
+"""
+End-to-end benchmark for the OCR analysis path.
+
+Renders synthetic lab reports with known values to PNG and image-only PDF
+at several resolutions and page counts, posts them to /analyze in-process,
+and reports:
+
+  * the latency breakdown per document from the Server-Timing header:
+    rasterize, preprocess and OCR time summed over pages, lab extraction,
+    NER, the full analysis and serialization, against end-to-end latency
+  * throughput and latency percentiles with N concurrent clients
+  * peak RSS of the API process and of the OCR worker processes
+  * lab value accuracy against the rendered ground truth
+
+Every upload gets a random suffix so it misses the analysis cache.
+
+Usage (from the backend directory, with Tesseract, poppler and httpx installed):
+    python benchmarks/ocr_benchmark.py [--dpis 150,200,300] [--pages 1,3] [--samples 3] [--clients 1,4]
+
+Exits with status 1 if lab value accuracy drops below --min-accuracy.
+"""
+import argparse
+import asyncio
+import io
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+import httpx
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, analyzer, ocr_executor  # noqa: E402
+
+A4_INCHES = (8.27, 11.69)
+FONT_POINTS = 11
+LINES_PER_PAGE = 40
+
+FILLER_WORDS = (
+    "the sample was received in good condition results reviewed within reference "
+    "interval laboratory method analyzer calibrated fasting specimen serum plasma"
+).split()
+
+# (lab key, rendered label, value generator, value format); labels follow the
+# analyzer's extraction patterns
+LABS = [
+    ('glucose', "Glucose", lambda r: r.randint(70, 220), "{:d} mg/dL"),
+    ('hba1c', "HbA1c", lambda r: round(r.uniform(4.5, 9.5), 1), "{:.1f} %"),
+    ('cholesterol_total', "Total Cholesterol", lambda r: r.randint(120, 300), "{:d} mg/dL"),
+    ('ldl', "LDL", lambda r: r.randint(50, 220), "{:d} mg/dL"),
+    ('hdl', "HDL", lambda r: r.randint(25, 90), "{:d} mg/dL"),
+    ('hemoglobin', "Hemoglobin", lambda r: round(r.uniform(8, 18), 1), "{:.1f} g/dL"),
+    ('creatinine', "Creatinine", lambda r: round(r.uniform(0.5, 3.5), 2), "{:.2f} mg/dL"),
+]
+
+
+def load_font(size):
+    for name in ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def make_report_lines(rng, pages):
+    """Lay out report lines across pages, returning (lines per page, ground truth)."""
+    truth = {}
+    lab_lines = []
+    for key, label, generate, fmt in LABS:
+        value = generate(rng)
+        truth[key] = float(value)
+        lab_lines.append(f"{label} {fmt.format(value)}")
+    systolic, diastolic = rng.randint(100, 180), rng.randint(60, 110)
+    truth['blood_pressure_systolic'] = float(systolic)
+    truth['blood_pressure_diastolic'] = float(diastolic)
+    lab_lines.append(f"Blood Pressure {systolic}/{diastolic} mmHg")
+    rng.shuffle(lab_lines)
+
+    page_lines = [[] for _ in range(pages)]
+    page_lines[0] = ["LABORATORY REPORT", "Patient ID: BENCH-{:06d}".format(rng.randint(0, 999999)), ""]
+    for line in lab_lines:
+        rng.choice(page_lines).append(line)
+    for page_number, lines in enumerate(page_lines):
+        # Filler goes anywhere below the header
+        first = 3 if page_number == 0 else 0
+        while len(lines) < LINES_PER_PAGE:
+            lines.insert(rng.randint(first, len(lines)), " ".join(rng.choice(FILLER_WORDS) for _ in range(8)))
+    return page_lines, truth
+
+
+def render_pages(page_lines, dpi):
+    font = load_font(round(FONT_POINTS * dpi / 72))
+    width, height = round(A4_INCHES[0] * dpi), round(A4_INCHES[1] * dpi)
+    margin, line_height = dpi, round(FONT_POINTS * 1.6 * dpi / 72)
+    pages = []
+    for lines in page_lines:
+        page = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(page)
+        for i, line in enumerate(lines):
+            draw.text((margin, margin + i * line_height), line, fill=0, font=font)
+        pages.append(page)
+    return pages
+
+
+def make_document(seed, fmt, pages, dpi):
+    """Render one synthetic report, returning (filename, content, ground truth)."""
+    rng = random.Random(seed)
+    page_lines, truth = make_report_lines(rng, pages)
+    images = render_pages(page_lines, dpi)
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        images[0].save(buffer, 'PNG', dpi=(dpi, dpi))
+    else:
+        images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:], resolution=dpi)
+    return f"report_{seed}.{fmt}", buffer.getvalue(), truth
+
+
+def uncached(content):
+    """Append random bytes (ignored by PNG and PDF readers) so the upload misses the cache."""
+    return content + b"\n%" + os.urandom(8).hex().encode()
+
+
+def score(truth, found):
+    """Return (correct, missing, wrong) lab value counts."""
+    correct = missing = wrong = 0
+    for key, expected in truth.items():
+        if key not in found:
+            missing += 1
+        elif math.isclose(found[key], expected, rel_tol=1e-3):
+            correct += 1
+        else:
+            wrong += 1
+    return correct, missing, wrong
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def analyze(client, filename, content):
+    start = time.perf_counter()
+    response = await client.post("/analyze", files={'file': (filename, content)})
+    return response, (time.perf_counter() - start) * 1000
+
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header into {stage: milliseconds}."""
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(','))):
+        name, _, params = entry.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                timings[name.strip()] = float(value)
+    return timings
+
+
+STAGES = ('rasterize', 'preprocess', 'ocr', 'lab_extraction', 'ner', 'analysis', 'serialize')
+
+
+async def run_latency(client, documents):
+    """Analyze documents one at a time and break each request down by stage."""
+    rows = []
+    for filename, content, truth in documents:
+        response, e2e_ms = await analyze(client, filename, uncached(content))
+        if response.status_code != 200:
+            print(f"  {filename}: HTTP {response.status_code} {response.text[:200]}")
+            continue
+        timings = parse_server_timing(response.headers.get('server-timing', ''))
+        row = {stage: timings.get(stage, 0.0) for stage in STAGES}
+        row.update(e2e=e2e_ms, score=score(truth, response.json()['data']['lab_values']))
+        rows.append(row)
+    return rows
+
+
+async def run_throughput(client, documents, clients, requests_per_client):
+    """Drive /analyze from `clients` concurrent clients and time every request."""
+    latencies, rejected, failed = [], 0, 0
+
+    async def worker(worker_id):
+        nonlocal rejected, failed
+        for i in range(requests_per_client):
+            filename, content, _ = documents[(worker_id + i) % len(documents)]
+            response, ms = await analyze(client, filename, uncached(content))
+            if response.status_code == 503:
+                rejected += 1
+                await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+            elif response.status_code != 200:
+                failed += 1
+            else:
+                latencies.append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        'docs_per_s': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) if latencies else float('nan'),
+        'p95_ms': percentile(latencies, 95) if latencies else float('nan'),
+        'rejected': rejected,
+        'failed': failed,
+    }
+
+
+async def main_async(args):
+    configs = []
+    for fmt in args.formats.split(','):
+        for pages in (int(p) for p in args.pages.split(',')):
+            if fmt == 'png' and pages > 1:
+                continue
+            for dpi in (int(d) for d in args.dpis.split(',')):
+                configs.append((fmt, pages, dpi))
+
+    transport = httpx.ASGITransport(app=app)
+    totals = [0, 0, 0]
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print("Mean milliseconds per document; page stages are summed over pages")
+        print(f"{'format':>6} {'pages':>5} {'dpi':>4} {'e2e':>7} {'raster':>7} {'prepro':>7} {'ocr':>7} "
+              f"{'labs':>6} {'ner':>6} {'analyze':>7} {'json':>6} {'accuracy':>9}")
+        for fmt, pages, dpi in configs:
+            documents = [make_document(seed, fmt, pages, dpi) for seed in range(args.samples)]
+            rows = await run_latency(client, documents)
+            if not rows:
+                continue
+            correct, missing, wrong = (sum(r['score'][i] for r in rows) for i in range(3))
+            for i, count in enumerate((correct, missing, wrong)):
+                totals[i] += count
+            mean = {key: statistics.mean(r[key] for r in rows) for key in ('e2e',) + STAGES}
+            print(f"{fmt:>6} {pages:>5} {dpi:>4} {mean['e2e']:>7.0f} {mean['rasterize']:>7.0f} "
+                  f"{mean['preprocess']:>7.0f} {mean['ocr']:>7.0f} {mean['lab_extraction']:>6.2f} "
+                  f"{mean['ner']:>6.1f} {mean['analysis']:>7.1f} {mean['serialize']:>6.1f} "
+                  f"{correct / (correct + missing + wrong):>9.1%}")
+
+        documents = [make_document(seed, fmt, pages, dpi)
+                     for seed, (fmt, pages, dpi) in enumerate(configs)]
+        print(f"\n{'clients':>7} {'docs/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'503s':>5} {'errors':>6}")
+        for clients in (int(c) for c in args.clients.split(',')):
+            result = await run_throughput(client, documents, clients, args.requests_per_client)
+            print(f"{clients:>7} {result['docs_per_s']:>7.2f} {result['p50_ms']:>8.0f} {result['p95_ms']:>8.0f} "
+                  f"{result['rejected']:>5} {result['failed']:>6}")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", default="png,pdf", help="comma separated: png, pdf")
+    parser.add_argument("--dpis", default="150,200,300", help="render resolutions")
+    parser.add_argument("--pages", default="1,3", help="page counts (PNG is always one page)")
+    parser.add_argument("--samples", type=int, default=3, help="documents per configuration")
+    parser.add_argument("--clients", default="1,4", help="concurrent client counts for the throughput run")
+    parser.add_argument("--requests-per-client", type=int, default=4, help="requests each client sends")
+    parser.add_argument("--min-accuracy", type=float, default=0.95, help="min fraction of lab values read correctly")
+    args = parser.parse_args()
+
+    if analyzer is None:
+        sys.exit("Analyzer failed to initialize")
+    correct, missing, wrong = asyncio.run(main_async(args))
+
+    # Worker processes only count towards RUSAGE_CHILDREN once they have exited
+    ocr_executor.shutdown(wait=True)
+    api_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\nPeak RSS: API process {api_mb:.0f} MB, largest OCR worker {workers_mb:.0f} MB")
+
+    total = correct + missing + wrong
+    accuracy = correct / total if total else 0.0
+    print(f"Lab values: {correct}/{total} correct, {missing} missing, {wrong} wrong ({accuracy:.1%})")
+    sys.exit(1 if accuracy < args.min_accuracy else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,24 @@
 import os
 import uuid
+import hashlib
 import time
 import tempfile
-import requests
+import threading
+import queue
+import asyncio
 import json
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
 
+import httpx
+import numpy as np
+import chromadb
+
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
@@ -21,6 +30,7 @@ from langdetect import detect
 from dotenv import load_dotenv
 
 # Langchain and ChromaDB imports
+from langchain_core.embeddings import Embeddings
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_community.document_loaders import TextLoader
@@ -33,6 +43,16 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 
+# Pooled HTTP client for Groq: request timeout and connection limits
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "30"))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "50"))
+
+# Threads per pool for blocking work kept off the event loop
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "8"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", "4"))
+
 app = FastAPI(title="TriFocus AI Chatbot", description="AI-powered  health assistant")
 
 # Enable CORS
@@ -55,9 +75,33 @@ CHROMA_DIR.mkdir(exist_ok=True)
 # Embedding model
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
+# Query embeddings: LRU cache entries, and how many concurrent queries are
+# batched into one encode call / how long the first one waits for company
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+# Semantic answer cache for /chat: minimum cosine similarity between query
+# embeddings to reuse an answer, entry lifetime, and max entries (0 disables)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+
+# Returned by generate_medical_response when the LLM call fails; never cached
+FALLBACK_RESPONSE = "I apologize, but I'm experiencing technical difficulties. Please consult with a healthcare professional for your medical concerns."
+
 # Health data file
 HEALTH_DATA_FILE = "health.txt"
 
+# Chunks embedded and written to ChromaDB per call during ingestion
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+
+# Each knowledge-base version is its own Chroma collection; this file in
+# CHROMA_DIR names the live one. "langchain" is the collection older
+# versions wrote into.
+ACTIVE_COLLECTION_FILE = CHROMA_DIR / "active_collection"
+DEFAULT_COLLECTION = "langchain"
+
 # Pydantic Models
 class QueryModel(BaseModel):
     message: str
@@ -86,18 +130,260 @@ class DiagnosisResponse(BaseModel):
     urgency_level: str
     next_steps: List[str]
 
-def load_and_store_medical_data(data_file=HEALTH_DATA_FILE):
+class EmbeddingService(Embeddings):
     """
-    Load and store medical data from health.txt file in ChromaDB vector store
+    Process-wide sentence embedding model.
+
+    The model is loaded once, on first use. Query vectors are kept in an LRU
+    cache keyed by normalized text, and cache misses from concurrent requests
+    are micro-batched into a single encode call by a background thread.
     """
+
+    def __init__(self, model_name, cache_size=EMBEDDING_CACHE_SIZE,
+                 batch_size=EMBEDDING_BATCH_SIZE, batch_wait_ms=EMBEDDING_BATCH_WAIT_MS):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self._model = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._pending = queue.Queue()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    print(f"Loading embedding model {self.model_name}")
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    @staticmethod
+    def normalize(text):
+        """Cache key for a query; the MiniLM tokenizer is uncased, so case is irrelevant."""
+        return " ".join(text.lower().split())
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(list(texts))
+
+    def embed_query(self, text):
+        key = self.normalize(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+        future = Future()
+        self._pending.put((key, future))
+        vector = future.result()
+
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(vector)
+
+    def _batch_loop(self):
+        """Collect pending queries for up to batch_wait and encode them together."""
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Identical in-flight queries are encoded once
+            texts = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.model.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_queries += len(batch)
+            for key, future in batch:
+                future.set_result(tuple(vectors[key]))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "model_loaded": self._model is not None,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "encode_batches": self.batches,
+            "mean_batch_size": self.batched_queries / self.batches if self.batches else 0.0,
+        }
+
+# Shared by the vector store and query retrieval
+embedding_service = EmbeddingService(EMBEDDING_MODEL)
+
+class SemanticAnswerCache:
+    """
+    Recent /chat answers, looked up by query embedding.
+
+    A query whose cosine similarity to a cached query reaches `threshold`
+    reuses that answer. Entries expire after `ttl` seconds, the least recently
+    used entry is evicted when the cache is full, and invalidate() drops
+    everything when the knowledge base changes.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        # Bumped on invalidation so answers computed against the old
+        # knowledge base are not stored afterwards
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _purge_expired(self, now):
+        for key in [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl]:
+            del self._entries[key]
+            self.expired += 1
+
+    def lookup(self, query_vector):
+        """Return the closest cached entry within the threshold, or None."""
+        if not self.enabled:
+            return None
+        vector = self._unit(query_vector)
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            if self._entries:
+                keys = list(self._entries)
+                similarities = np.stack([self._entries[key]['vector'] for key in keys]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    entry = self._entries[keys[best]]
+                    return {
+                        "query": entry['query'],
+                        "context": entry['context'],
+                        "answer": entry['answer'],
+                        "similarity": float(similarities[best]),
+                    }
+            self.misses += 1
+            return None
+
+    def store(self, query, query_vector, context, answer, generation):
+        """Cache an answer computed while the cache was at `generation`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[self._next_id] = {
+                "query": query,
+                "vector": self._unit(query_vector),
+                "context": context,
+                "answer": answer,
+                "created": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "invalidations": self.invalidations,
+        }
+
+answer_cache = SemanticAnswerCache()
+
+chroma_client = chromadb.PersistentClient(path=str(CHROMA_DIR))
+
+# Serializes knowledge-base updates
+ingest_lock = threading.Lock()
+
+def chunk_id(text):
+    """Content-addressed chunk id, so unchanged chunks keep their embeddings"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def read_active_collection():
     try:
+        return ACTIVE_COLLECTION_FILE.read_text().strip() or DEFAULT_COLLECTION
+    except FileNotFoundError:
+        return DEFAULT_COLLECTION
+
+def open_vectorstore(collection_name):
+    return Chroma(client=chroma_client, collection_name=collection_name, embedding_function=embedding_service)
+
+def load_and_store_medical_data(data_file=HEALTH_DATA_FILE):
+    """
+    Rebuild the knowledge base from a medical data file and swap it in.
+
+    Chunks are keyed by the hash of their text. A new staging collection is
+    filled with the chunks of the file: embeddings of chunks already in the
+    live collection are copied over, and only new chunks are embedded. Once
+    the staging collection is complete it becomes the live one, and the
+    `vectorstore` global and the answer cache are switched together, so
+    retrieval sees either the old or the new knowledge base, never a mix.
+    The replaced collection is kept for in-flight queries and dropped on the
+    next update. Returns counts of added, removed and unchanged chunks.
+    """
+    global vectorstore, active_collection
+    with ingest_lock:
         if not os.path.exists(data_file):
-            print(f"Warning: {data_file} not found. Creating empty vector store.")
-            # Create empty vector store
-            embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-            db = Chroma(persist_directory=str(CHROMA_DIR), embedding_function=embeddings)
-            return db
-            
+            print(f"Warning: {data_file} not found. Keeping the current vector store.")
+            return {"added": 0, "removed": 0, "unchanged": 0}
+
         loader = TextLoader(data_file, encoding='utf-8')
         docs = loader.load()
         
@@ -107,35 +393,98 @@ def load_and_store_medical_data(data_file=HEALTH_DATA_FILE):
             chunk_overlap=100,
             separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
         )
-        texts = text_splitter.split_documents(docs)
-        
-        # Create embeddings
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-        
-        # Create or update ChromaDB
-        db = Chroma.from_documents(
-            texts, 
-            embeddings, 
-            persist_directory=str(CHROMA_DIR)
-        )
-        print(f"Successfully loaded {len(texts)} chunks from {data_file}")
-        return db
-    except Exception as e:
-        print(f"Error loading medical data: {e}")
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-        return Chroma(persist_directory=str(CHROMA_DIR), embedding_function=embeddings)
+        chunks = {}
+        for chunk in text_splitter.split_documents(docs):
+            chunks.setdefault(chunk_id(chunk.page_content), chunk)
+
+        # Drop collections left by earlier updates or failed stagings
+        for collection in chroma_client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name != active_collection:
+                chroma_client.delete_collection(name)
+
+        live = chroma_client.get_or_create_collection(active_collection)
+        existing = set(live.get(include=[])["ids"])
+        kept_ids = [id_ for id_ in chunks if id_ in existing]
+        new_ids = [id_ for id_ in chunks if id_ not in existing]
+
+        staging_name = f"medical_kb_{uuid.uuid4().hex}"
+        staging = chroma_client.create_collection(staging_name)
+        try:
+            for i in range(0, len(kept_ids), INGEST_BATCH_SIZE):
+                kept = live.get(ids=kept_ids[i:i + INGEST_BATCH_SIZE], include=["embeddings"])
+                staging.add(
+                    ids=kept["ids"],
+                    embeddings=kept["embeddings"],
+                    documents=[chunks[id_].page_content for id_ in kept["ids"]],
+                    metadatas=[chunks[id_].metadata or None for id_ in kept["ids"]]
+                )
+            for i in range(0, len(new_ids), INGEST_BATCH_SIZE):
+                batch = new_ids[i:i + INGEST_BATCH_SIZE]
+                texts = [chunks[id_].page_content for id_ in batch]
+                staging.add(
+                    ids=batch,
+                    embeddings=embedding_service.embed_documents(texts),
+                    documents=texts,
+                    metadatas=[chunks[id_].metadata or None for id_ in batch]
+                )
+        except Exception:
+            chroma_client.delete_collection(staging_name)
+            raise
+
+        # Swap: persist the pointer first so a restart opens the new collection
+        pointer = ACTIVE_COLLECTION_FILE.with_suffix(".tmp")
+        pointer.write_text(staging_name)
+        os.replace(pointer, ACTIVE_COLLECTION_FILE)
+        active_collection = staging_name
+        vectorstore = open_vectorstore(staging_name)
+        answer_cache.invalidate()
+
+        stats = {
+            "added": len(new_ids),
+            "removed": len(existing) - len(kept_ids),
+            "unchanged": len(kept_ids),
+        }
+        print(f"Synced {len(chunks)} chunks from {data_file}: {stats['added']} added, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+        return stats
 
 # Initialize or load ChromaDB with medical data
+active_collection = read_active_collection()
 try:
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    vectorstore = Chroma(
-        persist_directory=str(CHROMA_DIR), 
-        embedding_function=embeddings
-    )
+    vectorstore = open_vectorstore(active_collection)
     print("Loaded existing medical vector store")
 except:
     print("Creating new medical vector store")
-    vectorstore = load_and_store_medical_data()
+    active_collection = DEFAULT_COLLECTION
+    vectorstore = None
+    load_and_store_medical_data()
+
+# Bounded pools for blocking steps: vector search (with query embedding),
+# language detection and translation, gTTS, and speech recognition
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+translation_executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translation")
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+speech_executor = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+
+async def run_blocking(executor, fn, *args):
+    """Run a blocking call in one of the bounded pools."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+http_client = None
+
+def get_http_client():
+    """Shared async HTTP client; opened at startup, closed at shutdown."""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {GROQ_API_KEY}"},
+            timeout=GROQ_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS,
+                                max_keepalive_connections=GROQ_MAX_CONNECTIONS)
+        )
+    return http_client
 
 def detect_language(text):
     """Detect language of the input text."""
@@ -163,6 +512,14 @@ def get_translator(target_lang='en'):
     """Get a translator for the specified target language."""
     return GoogleTranslator(source='auto', target=target_lang)
 
+def translate_text(text, source, target):
+    """Translate text, returning it unchanged if translation fails."""
+    try:
+        return GoogleTranslator(source=source, target=target).translate(text)
+    except Exception as e:
+        print(f"Translation error: {e}")
+        return text
+
 def text_to_speech(text, lang='en'):
     """Convert text to speech and save as an audio file."""
     try:
@@ -182,13 +539,16 @@ def text_to_speech(text, lang='en'):
         print(f"Text-to-speech error: {e}")
         return None
 
-def retrieve_medical_context(query, top_k=5):
+def retrieve_medical_context(query, top_k=5, query_vector=None):
     """
     Retrieve relevant medical context from ChromaDB
     """
     try:
-        # Retrieve top k most similar medical documents
-        docs = vectorstore.similarity_search(query, k=top_k)
+        # Retrieve top k most similar medical documents; the query vector
+        # comes from the shared, cached embedding service
+        if query_vector is None:
+            query_vector = embedding_service.embed_query(query)
+        docs = vectorstore.similarity_search_by_vector(query_vector, k=top_k)
         
         # Combine retrieved documents into context
         context = "\n\n".join([doc.page_content for doc in docs])
@@ -197,17 +557,10 @@ def retrieve_medical_context(query, top_k=5):
         print(f"Medical context retrieval error: {e}")
         return ""
 
-def generate_medical_response(message, context="", user_profile=None):
-    """Generate a medical response using Groq API with medical context."""
-    try:
-        # Prepare headers
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Enhanced medical prompt
-        system_prompt = """You are MediChain AI, an advanced medical assistant specialized in symptom analysis and health guidance. 
+def build_groq_payload(message, context="", user_profile=None):
+    """Build the Groq chat completion request with the medical prompt and context."""
+    # Enhanced medical prompt
+    system_prompt = """You are MediChain AI, an advanced medical assistant specialized in symptom analysis and health guidance. 
 
 IMPORTANT GUIDELINES:
 - Provide accurate, helpful medical information based on symptoms
@@ -220,12 +573,12 @@ IMPORTANT GUIDELINES:
 
 Your responses should be structured, informative, and focused on patient safety."""
 
-        # Prepare comprehensive prompt
-        user_context = ""
-        if user_profile:
-            user_context = f"Patient Context: Age: {user_profile.get('age', 'N/A')}, Gender: {user_profile.get('gender', 'N/A')}, Medical History: {user_profile.get('medical_history', [])}"
-        
-        full_prompt = f"""Medical Knowledge Base Context:
+    # Prepare comprehensive prompt
+    user_context = ""
+    if user_profile:
+        user_context = f"Patient Context: Age: {user_profile.get('age', 'N/A')}, Gender: {user_profile.get('gender', 'N/A')}, Medical History: {user_profile.get('medical_history', [])}"
+    
+    full_prompt = f"""Medical Knowledge Base Context:
 {context}
 
 {user_context}
@@ -241,25 +594,31 @@ Please provide a comprehensive medical assessment including:
 
 Respond naturally and professionally without referencing the knowledge base directly."""
 
-        # Prepare payload
-        payload = {
-            "model": "llama3-70b-8192",  # Using larger model for better medical responses
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ],
-            "temperature": 0.3,  # Lower temperature for more consistent medical responses
-            "max_tokens": 1500
-        }
+    # Prepare payload
+    payload = {
+        "model": "llama3-70b-8192",  # Using larger model for better medical responses
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": full_prompt
+            }
+        ],
+        "temperature": 0.3,  # Lower temperature for more consistent medical responses
+        "max_tokens": 1500
+    }
+    return payload
+
+async def generate_medical_response(message, context="", user_profile=None):
+    """Generate a medical response using Groq API with medical context."""
+    try:
+        payload = build_groq_payload(message, context, user_profile)
         
-        # Make the request
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=30)
+        # Make the request over the shared connection pool
+        response = await get_http_client().post(GROQ_API_URL, json=payload)
         response.raise_for_status()
         
         # Parse the response
@@ -267,15 +626,34 @@ Respond naturally and professionally without referencing the knowledge base dire
         return result["choices"][0]["message"]["content"]
     except Exception as e:
         print(f"Groq API error: {e}")
-        return "I apologize, but I'm experiencing technical difficulties. Please consult with a healthcare professional for your medical concerns."
+        return FALLBACK_RESPONSE
+
+async def stream_medical_response(message, context="", user_profile=None):
+    """
+    Stream a medical response from Groq, yielding content deltas as the
+    OpenAI-compatible server-sent events arrive.
+    """
+    payload = build_groq_payload(message, context, user_profile)
+    payload["stream"] = True
+    async with get_http_client().stream("POST", GROQ_API_URL, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
 
-def analyze_symptoms(symptoms_data: SymptomAnalysisModel):
+async def analyze_symptoms(symptoms_data: SymptomAnalysisModel):
     """Analyze symptoms and provide medical insights"""
     symptoms_text = ", ".join(symptoms_data.symptoms)
     context_query = f"symptoms: {symptoms_text} age: {symptoms_data.age} gender: {symptoms_data.gender}"
     
     # Retrieve relevant medical context
-    context = retrieve_medical_context(context_query, top_k=7)
+    context = await run_blocking(retrieval_executor, retrieve_medical_context, context_query, 7)
     
     # Create detailed query for analysis
     detailed_query = f"""
@@ -290,52 +668,66 @@ def analyze_symptoms(symptoms_data: SymptomAnalysisModel):
     """
     
     # Generate medical response
-    response = generate_medical_response(detailed_query, context)
+    response = await generate_medical_response(detailed_query, context)
     
     return response
 
+async def prepare_chat_query(message):
+    """
+    Detect the message language, translate it to English and look up the
+    semantic answer cache. Returns (language, English message, query vector,
+    cached entry or None).
+    """
+    # Detect language of input
+    detected_lang = await run_blocking(translation_executor, detect_language, message)
+    
+    # Translate to English for processing if needed
+    english_message = message
+    if detected_lang != 'en':
+        english_message = await run_blocking(translation_executor, translate_text, message, detected_lang, 'en')
+    
+    # Reuse the answer to a semantically equivalent recent question
+    query_vector = await run_blocking(retrieval_executor, embedding_service.embed_query, english_message)
+    return detected_lang, english_message, query_vector, answer_cache.lookup(query_vector)
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/chat")
 async def medical_chat(query: QueryModel):
     """
     Process medical chat messages with translation and text-to-speech support.
     """
     try:
-        # Detect language of input
-        detected_lang = detect_language(query.message)
-        
-        # Translate to English for processing if needed
-        english_message = query.message
-        if detected_lang != 'en':
-            try:
-                translator = GoogleTranslator(source=detected_lang, target='en')
-                english_message = translator.translate(query.message)
-            except Exception as e:
-                print(f"Translation error: {e}")
-        
-        # Retrieve medical context from health.txt
-        context = retrieve_medical_context(english_message)
-        
-        # Generate medical response
-        response_text = generate_medical_response(english_message, context)
+        detected_lang, english_message, query_vector, cached = await prepare_chat_query(query.message)
+        if cached:
+            response_text = cached["answer"]
+        else:
+            generation = answer_cache.generation
+
+            # Retrieve medical context from health.txt
+            context = await run_blocking(retrieval_executor, retrieve_medical_context, english_message, 5, query_vector)
+
+            # Generate medical response
+            response_text = await generate_medical_response(english_message, context)
+            if response_text != FALLBACK_RESPONSE:
+                answer_cache.store(english_message, query_vector, context, response_text, generation)
         
         # Translate response back if needed
         final_response = response_text
         if detected_lang != 'en':
-            try:
-                translator = GoogleTranslator(source='en', target=detected_lang)
-                final_response = translator.translate(response_text)
-            except Exception as e:
-                print(f"Response translation error: {e}")
-                final_response = response_text
+            final_response = await run_blocking(translation_executor, translate_text, response_text, 'en', detected_lang)
         
         # Convert to speech
-        audio_filename = text_to_speech(final_response, detected_lang)
+        audio_filename = await run_blocking(tts_executor, text_to_speech, final_response, detected_lang)
         
         return {
             "text_response": final_response,
             "english_response": response_text,
             "audio_file_path": audio_filename,
             "detected_language": detected_lang,
+            "cache_hit": cached is not None,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -347,13 +739,79 @@ async def medical_chat(query: QueryModel):
             "detected_language": "en"
         }
 
+@app.post("/chat/stream")
+async def medical_chat_stream(query: QueryModel):
+    """
+    Streaming version of /chat as server-sent events.
+
+    Emits `token` events with English text as the model produces it (a
+    cached answer arrives as a single token), then `translation` when the
+    message was not in English, `audio` with the speech file, and finally
+    `done` with the full response. Failures are reported as an `error` event.
+    """
+    async def events():
+        try:
+            detected_lang, english_message, query_vector, cached = await prepare_chat_query(query.message)
+            if cached:
+                response_text = cached["answer"]
+                yield sse_event("token", {"text": response_text})
+            else:
+                generation = answer_cache.generation
+                context = await run_blocking(retrieval_executor, retrieve_medical_context, english_message, 5, query_vector)
+
+                tokens = []
+                try:
+                    async for delta in stream_medical_response(english_message, context):
+                        tokens.append(delta)
+                        yield sse_event("token", {"text": delta})
+                except Exception as e:
+                    print(f"Groq streaming error: {e}")
+                    if tokens:
+                        # Part of the answer is already out; don't pretend it is complete
+                        yield sse_event("error", {"error": "Response interrupted. Please try again."})
+                        return
+                    tokens = [FALLBACK_RESPONSE]
+                    yield sse_event("token", {"text": FALLBACK_RESPONSE})
+
+                response_text = "".join(tokens)
+                if response_text != FALLBACK_RESPONSE:
+                    answer_cache.store(english_message, query_vector, context, response_text, generation)
+
+            # Translate response back if needed
+            final_response = response_text
+            if detected_lang != 'en':
+                final_response = await run_blocking(translation_executor, translate_text, response_text, 'en', detected_lang)
+                yield sse_event("translation", {"text_response": final_response, "language": detected_lang})
+
+            # Convert to speech
+            audio_filename = await run_blocking(tts_executor, text_to_speech, final_response, detected_lang)
+            yield sse_event("audio", {"audio_file_path": audio_filename})
+
+            yield sse_event("done", {
+                "text_response": final_response,
+                "english_response": response_text,
+                "audio_file_path": audio_filename,
+                "detected_language": detected_lang,
+                "cache_hit": cached is not None,
+                "timestamp": datetime.now().isoformat()
+            })
+        except Exception as e:
+            print(f"Medical chat stream error: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/symptom-analysis")
 async def symptom_analysis(symptoms: SymptomAnalysisModel):
     """
     Advanced symptom analysis endpoint
     """
     try:
-        analysis_result = analyze_symptoms(symptoms)
+        analysis_result = await analyze_symptoms(symptoms)
         
         return {
             "analysis": analysis_result,
@@ -369,6 +827,24 @@ async def symptom_analysis(symptoms: SymptomAnalysisModel):
             "timestamp": datetime.now().isoformat()
         }
 
+def transcribe_audio(audio_path):
+    """Transcribe a WAV file, trying several languages; returns (text, language)."""
+    # Initialize speech recognizer
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(audio_path) as source:
+        recognizer.adjust_for_ambient_noise(source, duration=1)
+        audio = recognizer.record(source)
+    
+    # Try different languages for transcription
+    languages_to_try = ['en-US', 'hi-IN', 'es-ES', 'fr-FR']
+    
+    for lang in languages_to_try:
+        try:
+            return recognizer.recognize_google(audio, language=lang), lang.split('-')[0]
+        except:
+            continue
+    return "", 'en'
+
 @app.post("/voice-input")
 async def process_medical_voice(file: UploadFile = File(...)):
     """
@@ -381,46 +857,24 @@ async def process_medical_voice(file: UploadFile = File(...)):
         temp_file.write(content)
         temp_file.close()
 
-        # Initialize speech recognizer
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(temp_file.name) as source:
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-            audio = recognizer.record(source)
-        
         # Attempt transcription with multiple languages
-        transcribed_text = ""
-        detected_lang = 'en'
-        
-        # Try different languages for transcription
-        languages_to_try = ['en-US', 'hi-IN', 'es-ES', 'fr-FR']
-        
-        for lang in languages_to_try:
-            try:
-                transcribed_text = recognizer.recognize_google(audio, language=lang)
-                detected_lang = lang.split('-')[0]
-                break
-            except:
-                continue
+        transcribed_text, detected_lang = await run_blocking(speech_executor, transcribe_audio, temp_file.name)
         
         if not transcribed_text:
             raise Exception("Could not transcribe audio")
 
         # Retrieve medical context
-        context = retrieve_medical_context(transcribed_text)
+        context = await run_blocking(retrieval_executor, retrieve_medical_context, transcribed_text)
 
         # Generate medical response
-        response_text = generate_medical_response(transcribed_text, context)
+        response_text = await generate_medical_response(transcribed_text, context)
         
         # Translate if needed
         if detected_lang != 'en':
-            try:
-                translator = GoogleTranslator(source='en', target=detected_lang)
-                response_text = translator.translate(response_text)
-            except Exception as e:
-                print(f"Translation error: {e}")
+            response_text = await run_blocking(translation_executor, translate_text, response_text, 'en', detected_lang)
 
         # Convert to speech
-        audio_filename = text_to_speech(response_text, detected_lang)
+        audio_filename = await run_blocking(tts_executor, text_to_speech, response_text, detected_lang)
 
         return {
             "transcribed_text": transcribed_text,
@@ -464,18 +918,38 @@ async def update_medical_database(file: UploadFile = File(...)):
         temp_file.write(content)
         temp_file.close()
 
-        # Reload database with new medical file
-        global vectorstore
-        vectorstore = load_and_store_medical_data(temp_file.name)
-
-        # Clean up temporary file
-        os.unlink(temp_file.name)
+        # Rebuild the database from the new medical file; only changed chunks
+        # are embedded, and the new version is swapped in once complete
+        try:
+            stats = await run_blocking(None, load_and_store_medical_data, temp_file.name)
+        finally:
+            # Clean up temporary file
+            os.unlink(temp_file.name)
 
-        return {"status": "Medical database updated successfully", "timestamp": datetime.now().isoformat()}
+        return {
+            "status": "Medical database updated successfully",
+            "chunks": stats,
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         print(f"Medical database update error: {e}")
         return {"error": str(e)}
 
+@app.on_event("startup")
+async def startup_event():
+    """Open the pooled Groq client."""
+    get_http_client()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the Groq client and release the worker pools."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    for executor in (retrieval_executor, translation_executor, tts_executor, speech_executor):
+        executor.shutdown(wait=False)
+
 @app.get("/health-check")
 async def health_check():
     """
@@ -485,6 +959,19 @@ async def health_check():
         "status": "healthy",
         "service": "MediChain AI Chatbot",
         "version": "1.0.0",
+        "embeddings": embedding_service.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/chat-cache/stats")
+async def chat_cache_stats():
+    """
+    Hit rate and eviction counters for the semantic answer cache and the
+    query embedding cache
+    """
+    return {
+        "answers": answer_cache.stats(),
+        "embeddings": embedding_service.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -498,9 +985,11 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/chat - Medical chat interface",
+            "chat_stream": "/chat/stream - Medical chat streamed as server-sent events",
             "symptom_analysis": "/symptom-analysis - Advanced symptom analysis",
             "voice_input": "/voice-input - Voice-based medical queries",
-            "health_check": "/health-check - Service health status"
+            "health_check": "/health-check - Service health status",
+            "chat_cache_stats": "/chat-cache/stats - Answer cache hit rate"
         }
     }
 